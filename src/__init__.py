@@ -2,3 +2,5 @@ import gi
 
 gi.require_version('Gtk', '4.0')
 gi.require_version('Adw', '1')
+gi.require_version('Pango', '1.0')
+gi.require_version('PangoCairo', '1.0')
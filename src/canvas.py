@@ -23,21 +23,16 @@ from gi.repository import Gdk, Gio, GObject
 
 import threading
 import math
+import itertools
 import emoji
+import cairo
 
-class Change():
-    def __init__(self, _name):
-        self.changes = []
-        self.name = _name
-
-    def add_change(self, x, y, prev_char):
-        for change in self.changes:
-            if change[0] == x and change[1] == y:
-                return
-        self.changes.append((x, y, prev_char))
-
-    def __repr__(self):
-        return f"The change named {self.name} has {len(self.changes)} changes"
+from .grid import Overlay, TiledGrid, TILE_WIDTH, TILE_HEIGHT
+from .history import Change, History, RegionSnapshot, Stroke
+from . import journal
+from .flood import ComponentIndex, spans_mask
+from .glyph_atlas import GlyphAtlas
+from .row_layouts import RowLayouts
 
 @Gtk.Template(resource_path='/io/github/nokse22/asciidraw/ui/canvas.ui')
 class Canvas(Adw.Bin):
@@ -45,11 +40,16 @@ class Canvas(Adw.Bin):
     draw_drawing_area = Gtk.Template.Child()
     preview_drawing_area = Gtk.Template.Child()
     fixed = Gtk.Template.Child()
+    scrolled_window = Gtk.Template.Child()
 
     __gsignals__ = {
         'undo-added': (GObject.SignalFlags.RUN_FIRST, None, (str,)),
         'undo-removed': (GObject.SignalFlags.RUN_FIRST, None, ()),
-        'redo-removed': (GObject.SignalFlags.RUN_FIRST, None, ())
+        'redo-removed': (GObject.SignalFlags.RUN_FIRST, None, ()),
+        'undo-evicted': (GObject.SignalFlags.RUN_FIRST, None, ()),
+        'history-changed': (GObject.SignalFlags.RUN_FIRST, None, ()),
+        'node-undone': (GObject.SignalFlags.RUN_FIRST, None, (object,)),
+        'node-redone': (GObject.SignalFlags.RUN_FIRST, None, (object,))
     }
 
     def __init__(self, _styles, _flip):
@@ -60,8 +60,8 @@ class Canvas(Adw.Bin):
         self.primary_char = '#'
         self.secondary_char = '+'
 
-        self.drawing: list[list[str]] = []
-        self.preview: list[list[str]] = []
+        self.drawing: TiledGrid = None
+        self.preview: Overlay = None
 
         self.primary_selected = True
 
@@ -82,9 +82,23 @@ class Canvas(Adw.Bin):
         self.zoom_gesture.connect("scale-changed", self.on_scale_changed)
         self.fixed.add_controller(self.zoom_gesture)
 
+        # Connected after the tools so the change a gesture made is
+        # complete when it gets journaled
+        self.drag_gesture.connect_after("drag-end", self.on_gesture_end)
+        self.click_gesture.connect_after("released", self.on_gesture_end)
+
+        self.motion_controller = Gtk.EventControllerMotion()
+        self.fixed.add_controller(self.motion_controller)
+
         self.draw_drawing_area.set_draw_func(self.drawing_function, None)
         self.preview_drawing_area.set_draw_func(self.preview_drawing_function, None)
 
+        # Only the visible part of the drawing is rasterized, it has to
+        # be drawn again when the view is scrolled or resized
+        for adjustment in (self.scrolled_window.get_hadjustment(), self.scrolled_window.get_vadjustment()):
+            adjustment.connect("value-changed", self.on_view_changed)
+            adjustment.connect("notify::page-size", self.on_view_changed)
+
         self.x_mul = 12
         self.y_mul = 24
 
@@ -93,23 +107,54 @@ class Canvas(Adw.Bin):
 
         self.draw_drawing_area.set_size_request(self.canvas_width*self.x_mul, self.canvas_height*self.y_mul)
 
-        for y in range(self.canvas_height):
-            new_line = []
-            for x in range(self.canvas_width):
-                new_line.append(" ")
-            self.drawing.append(new_line)
-            self.preview.append(new_line)
+        self.drawing = TiledGrid(self.canvas_width, self.canvas_height)
+        self.preview = Overlay(self.canvas_width, self.canvas_height)
+
+        # Connected areas of equal characters, labeled when first asked
+        # for and dropped where the drawing gets damaged
+        self.component_index = ComponentIndex(self.drawing)
+
+        # Cells of the drawing changed since the last frame, as
+        # (x, y, width, height) rectangles
+        self.dirty_rects = set()
+        self.dirty_all = True
+
+        # Committed drawing rasterized off screen, only the dirty cells
+        # are painted again before it gets copied on the drawing area.
+        # It backs the visible cells rounded out to whole tiles as left,
+        # top, right, bottom so its size doesn't depend on the canvas
+        self.surface = None
+        self.surface_cells = None
+        self.surface_row_height = None
+        self.glyph_atlas = GlyphAtlas(self.x_mul, self.y_mul)
+        self.row_layouts = RowLayouts(self.x_mul, self.y_mul)
+
+        self.history = History()
+        self.changed_chars = []
 
-        self.x_mul = 12
-        self.y_mul = 24
+        # Limits of the undo history, the oldest changes are dropped
+        # when either is exceeded and all but the newest are compressed
+        self._history_max_steps = 200
+        self._history_max_bytes = 64 * 1024 * 1024
+        self.history_unpacked_steps = 8
 
-        self.undo_changes = []
-        self.changed_chars = []
+        # Committed changes are streamed to the journal so the drawing
+        # can be recovered after a crash, the open change is the one
+        # still being recorded
+        self.journal = None
+        self._open_change = None
 
-        self.redo_changes = []
+        # Cells inside the last selection as x, y, width and height, it
+        # stays after the selection tool is changed
+        self.selection_rect = None
 
-        self.canvas_max_x = 100
-        self.canvas_max_y = 50
+        # Cells overwritten by the drag in progress, they are merged in
+        # the undo change when the drag ends
+        self.stroke = None
+
+        # Largest canvas in characters
+        self.canvas_max_x = 2048
+        self.canvas_max_y = 1024
 
         self.scale_factor = 1
 
@@ -145,6 +190,26 @@ class Canvas(Adw.Bin):
         self._secondary_char = value
         self.notify('secondary_char')
 
+    @GObject.Property(type=int, default=200, minimum=1)
+    def history_max_steps(self):
+        return self._history_max_steps
+
+    @history_max_steps.setter
+    def history_max_steps(self, value):
+        self._history_max_steps = value
+        self.trim_history()
+        self.notify('history_max_steps')
+
+    @GObject.Property(type=int, default=64 * 1024 * 1024, minimum=0)
+    def history_max_bytes(self):
+        return self._history_max_bytes
+
+    @history_max_bytes.setter
+    def history_max_bytes(self, value):
+        self._history_max_bytes = value
+        self.trim_history()
+        self.notify('history_max_bytes')
+
     @GObject.Property(type=int, default=0)
     def style(self):
         return self._style
@@ -160,75 +225,441 @@ class Canvas(Adw.Bin):
         # if scale > 2:
         #     self.scale_factor = 2
 
+    def on_view_changed(self, *args):
+        self.draw_drawing_area.queue_draw()
+
+    def visible_cells(self, area):
+        """Returns the cells of the drawing shown by the scrolled window
+        as left, top, right, bottom, rounded out to whole tiles"""
+        row_height = self.y_mul * self.scale_factor
+        found, x, y = area.translate_coordinates(self.scrolled_window, 0, 0)
+        if not found:
+            x, y = 0, 0
+        view_left = max(-x, 0)
+        view_top = max(-y, 0)
+        view_right = view_left + max(self.scrolled_window.get_width(), 1)
+        view_bottom = view_top + max(self.scrolled_window.get_height(), 1)
+
+        left = int(view_left // self.x_mul) // TILE_WIDTH * TILE_WIDTH
+        top = int(view_top // row_height) // TILE_HEIGHT * TILE_HEIGHT
+        right = -(-math.ceil(view_right / self.x_mul) // TILE_WIDTH) * TILE_WIDTH
+        bottom = -(-math.ceil(view_bottom / row_height) // TILE_HEIGHT) * TILE_HEIGHT
+        return (min(left, self.canvas_width), min(top, self.canvas_height),
+                min(right, self.canvas_width), min(bottom, self.canvas_height))
+
     def drawing_function(self, area, cr, width, height, data):
-        cr.set_source_rgb(self.color, self.color, self.color)
-        cr.select_font_face("monospace")
-        cr.set_font_size(20 * self.scale_factor)
+        device_scale = area.get_scale_factor()
+        row_height = self.y_mul * self.scale_factor
+        left, top, right, bottom = self.visible_cells(area)
+        if left >= right or top >= bottom:
+            return
 
-        for y, line in enumerate(self.drawing):
-            for x, char in enumerate(line):
-                cr.move_to(x * self.x_mul, (y + 1) * self.y_mul * self.scale_factor - 5)
-                cr.show_text(char)
+        # The surface is kept while the visible cells stay inside it,
+        # otherwise one covering the new view replaces it
+        if (self.surface is None
+                or self.surface.get_device_scale() != (device_scale, device_scale)
+                or self.surface_row_height != row_height
+                or left < self.surface_cells[0] or top < self.surface_cells[1]
+                or right > self.surface_cells[2] or bottom > self.surface_cells[3]):
+            self.surface = cairo.ImageSurface(
+                cairo.FORMAT_ARGB32,
+                (right - left) * self.x_mul * device_scale,
+                math.ceil((bottom - top) * row_height) * device_scale)
+            self.surface.set_device_scale(device_scale, device_scale)
+            self.surface_cells = left, top, right, bottom
+            self.surface_row_height = row_height
+            self.repaint_all()
+
+        self.render_dirty(device_scale)
+
+        left, top, right, bottom = self.surface_cells
+        cr.set_source_surface(self.surface, left * self.x_mul, top * row_height)
+        cr.paint()
+
+    def render_dirty(self, device_scale=1):
+        if self.dirty_bounds() is None:
+            return
+
+        row_height = self.y_mul * self.scale_factor
+        self.configure_glyph_atlas(device_scale)
+        surface_left, surface_top, surface_right, surface_bottom = self.surface_cells
+        surface_cr = cairo.Context(self.surface)
+        surface_cr.translate(-surface_left * self.x_mul, -surface_top * row_height)
+
+        # Whole rows are drawn as runs with their cached layouts, the
+        # glyph atlas stamps the cells of smaller changes. Cells outside
+        # the surface are drawn when it moves over them
+        if self.dirty_all:
+            surface_cr.set_operator(cairo.OPERATOR_CLEAR)
+            surface_cr.paint()
+            surface_cr.set_operator(cairo.OPERATOR_OVER)
+            self.row_layouts.forget_rows_after(self.drawing.height)
+            for y, line in self.drawing.iter_rows(surface_top, surface_bottom):
+                self.row_layouts.draw_row(surface_cr, y, line, self.color)
+        else:
+            for x, y, width, height in self.dirty_rects:
+                left = max(x, surface_left)
+                top = max(y, surface_top)
+                right = min(x + width, self.drawing.width, surface_right)
+                bottom = min(y + height, self.drawing.height, surface_bottom)
+                if left >= right or top >= bottom:
+                    continue
+                surface_cr.set_operator(cairo.OPERATOR_CLEAR)
+                surface_cr.rectangle(
+                    left * self.x_mul, top * row_height,
+                    (right - left) * self.x_mul, (bottom - top) * row_height)
+                surface_cr.fill()
+                surface_cr.set_operator(cairo.OPERATOR_OVER)
+                for y in range(top, bottom):
+                    if left == 0 and right == self.drawing.width:
+                        self.row_layouts.draw_row(surface_cr, y, self.drawing.get_row(y), self.color)
+                    else:
+                        self.__render_line(surface_cr, left, y, self.drawing.get_row(y, left, right))
+
+        self.dirty_rects.clear()
+        self.dirty_all = False
+
+    def configure_glyph_atlas(self, device_scale=1):
+        self.glyph_atlas.configure(
+            20 * self.scale_factor, self.color, device_scale,
+            self.y_mul * self.scale_factor)
+        self.row_layouts.configure(20 * self.scale_factor, self.y_mul * self.scale_factor)
+
+    def __render_line(self, cr, start_x, y, line):
+        top = y * self.y_mul * self.scale_factor
+        for x, char in enumerate(line, start_x):
+            if char == " ":
+                continue
+            self.glyph_atlas.stamp(cr, char, x * self.x_mul, top)
 
     def preview_drawing_function(self, area, cr, width, height, data):
-        cr.set_source_rgb(self.color, self.color, self.color)
-        cr.select_font_face("monospace")
-        cr.set_font_size(20 * self.scale_factor)
+        self.configure_glyph_atlas(area.get_scale_factor())
+
+        scale = self.scale_factor
+        for x, y, char in self.preview.iter_cells():
+            self.glyph_atlas.stamp(cr, char, x * self.x_mul, y * self.y_mul * scale)
 
-        for y, line in enumerate(self.preview):
-            for x, char in enumerate(line):
-                cr.move_to(x * self.x_mul, (y + 1) * self.y_mul * self.scale_factor - 5)
-                cr.show_text(char)
+    def damage(self, x, y, width=1, height=1):
+        self.component_index.invalidate(int(x), int(y), int(width), int(height))
+        if self.dirty_all:
+            return
+        self.dirty_rects.add((int(x), int(y), int(width), int(height)))
+
+    def damage_all(self):
+        self.repaint_all()
+        self.component_index.reset(self.drawing)
+
+    def repaint_all(self):
+        """Paints the whole surface again on the next frame, for when the
+        drawing stays the same but the way it looks or the surface changes"""
+        self.dirty_all = True
+        self.dirty_rects.clear()
+
+    def dirty_bounds(self):
+        """Returns the union of the dirty rectangles as x, y, width,
+        height or None if nothing changed since the last frame"""
+        if self.dirty_all:
+            return 0, 0, self.canvas_width, self.canvas_height
+        if not self.dirty_rects:
+            return None
+        left = min(rect[0] for rect in self.dirty_rects)
+        top = min(rect[1] for rect in self.dirty_rects)
+        right = max(rect[0] + rect[2] for rect in self.dirty_rects)
+        bottom = max(rect[1] + rect[3] for rect in self.dirty_rects)
+        return left, top, right - left, bottom - top
 
     def update(self):
+        # Outside of a gesture the change is finished, it is journaled
+        # right away so a crash doesn't lose it
+        if not self.drag_gesture.is_active() and not self.click_gesture.is_active():
+            self.commit_change()
+        if self.dirty_bounds() is None:
+            return
         self.draw_drawing_area.queue_draw()
 
+    def on_gesture_end(self, *args):
+        self.commit_change()
+
     def update_preview(self):
         self.preview_drawing_area.queue_draw()
 
     def undo(self):
-        try:
-            change_object = self.undo_changes[-1]
-        except:
+        if not self.history.can_undo():
             return
-        redo_object = Change(change_object.name)
-        for x, y, char in change_object.changes:
-            if y >= len(self.drawing) or x >= len(self.drawing[0]) or x < 0 or y < 0:
-                return
-            redo_object.add_change(x, y, self.get_char_at(x,y))
-            self.drawing[int(y)][int(x)] = char
-
-        self.redo_changes.append(redo_object)
-        self.undo_changes.pop(-1)
+        self.commit_change()
+        self.__undo_node(self.history.current)
         self.emit("undo-removed")
         self.update()
 
     def redo(self):
-        try:
-            change_object = self.redo_changes[-1]
-        except:
+        node = self.history.current.redo_child
+        if node is None:
             return
-        self.add_undo_action(change_object.name)
-        for x, y, char in change_object.changes:
-            if y >= len(self.drawing) or x >= len(self.drawing[0]) or x < 0 or y < 0:
-                return
-            self.undo_changes[-1].add_change(x, y, self.get_char_at(x,y))
-            self.drawing[int(y)][int(x)] = char
-        self.redo_changes.pop(-1)
+        self.commit_change()
+        self.__redo_node(node)
         self.emit("redo-removed")
         self.update()
 
+    def jump_to(self, node):
+        """Brings the drawing to the state after node, undoing up to the
+        lowest common ancestor with the current node and redoing down
+        from there"""
+        self.commit_change()
+        up, down = self.history.path_to(node)
+        for step in up:
+            self.__undo_node(step)
+        for step in down:
+            self.__redo_node(step)
+        self.emit("history-changed")
+        self.update()
+
+    def reset_history(self):
+        self.commit_change()
+        self.history = History()
+        self.emit("history-changed")
+
+    def __undo_node(self, node):
+        node.redo = Change(node.name)
+        self.__apply_change(node.undo, node.redo)
+        self.__journal_change(node.undo)
+        node.parent.redo_child = node
+        self.history.current = node.parent
+        self.is_saved = False
+        self.emit("node-undone", node)
+
+    def __redo_node(self, node):
+        node.undo = Change(node.name)
+        self.__apply_change(node.redo, node.undo)
+        self.__journal_change(node.redo)
+        # Only the nodes off the current path need their redo
+        node.redo = None
+        node.parent.redo_child = node
+        self.history.current = node
+        self.is_saved = False
+        self.emit("node-redone", node)
+
+    def __apply_change(self, change, inverse):
+        # Everything change will overwrite is recorded in inverse before
+        # writing, regions are restored newest first and the cells last
+        # so the first recorded character of a cell wins
+        change.unpack()
+        if change.grid is not None:
+            # The grids are swapped, the one given to inverse is never
+            # written again and the restored one is a copy sharing tiles
+            inverse.set_grid(self.drawing)
+            self.drawing = change.grid.copy()
+            self.__resize(self.drawing.width, self.drawing.height)
+            return
+        for region in change.regions:
+            inverse.add_region(RegionSnapshot.capture(
+                self.drawing, region.x, region.y, region.width, region.height, region.mask))
+        cells = [(x, y, char) for x, y, char in change.changes if self.drawing.in_bounds(x, y)]
+        for x, y, char in cells:
+            inverse.add_change(x, y, self.drawing.get_char_at(x, y))
+
+        for region in reversed(change.regions):
+            region.restore(self.drawing)
+            self.damage(region.x, region.y, region.width, region.height)
+        for x, y, char in cells:
+            self.drawing.set_char_at(x, y, char)
+            self.damage(x, y)
+
+    def record_grid(self):
+        """Keeps the whole drawing in the current undo action by
+        reference, the drawing continues on a copy sharing its tiles"""
+        change = self.history.current.undo
+        if change.grid is not None:
+            return
+        change.set_grid(self.drawing)
+        self.drawing = self.drawing.copy()
+        self.component_index.reset(self.drawing)
+
+    def record_region(self, x, y, width, height, mask=None):
+        """Snapshots a rectangle of the drawing in the current undo
+        action, the cells it covers are not recorded one by one after"""
+        self.history.current.undo.add_region(RegionSnapshot.capture(self.drawing, x, y, width, height, mask))
+
+    def fill_region(self, x, y, width, height, char):
+        """Fills a rectangle of the drawing with char recording it as
+        one region"""
+        x, y, width, height = int(x), int(y), int(width), int(height)
+        if width <= 0 or height <= 0:
+            return
+        self.record_region(x, y, width, height)
+        for row in range(max(y, 0), min(y + height, self.canvas_height)):
+            self.drawing.fill_row(row, max(x, 0), min(x + width, self.canvas_width), char or ' ')
+        self.damage(x, y, width, height)
+
+    def fill_spans(self, spans, char):
+        """Fills the y, start, end spans sorted by row with char
+        recording them as one masked region"""
+        if not spans:
+            return
+        x, y, width, height, mask = spans_mask(spans)
+        self.record_region(x, y, width, height, mask)
+        for row, start, end in spans:
+            self.drawing.fill_row(row, start, end, char or ' ')
+        self.damage(x, y, width, height)
+
+    def write_spans(self, spans, texts, draw):
+        """Writes the text of every y, start, end span, on the drawing
+        they are recorded as one masked region"""
+        if not spans:
+            return
+        if not draw:
+            for (row, start, end), text in zip(spans, texts):
+                self.preview.set_row(row, text, start)
+            return
+        x, y, width, height, mask = spans_mask(spans)
+        self.record_region(x, y, width, height, mask)
+        for (row, start, end), text in zip(spans, texts):
+            self.drawing.set_row(row, text, start)
+        self.damage(x, y, width, height)
+
+    def component_at(self, x, y):
+        """Returns the connected area of equal characters under x, y or
+        None outside of the drawing"""
+        return self.component_index.component_at(x, y)
+
     def add_undo_action(self, undo_name):
-        self.undo_changes.append(Change(undo_name))
+        self.commit_change()
+        self._open_change = Change(undo_name)
+        self.history.add(self._open_change)
         self.emit('undo-added', undo_name)
+        self.trim_history()
 
         self.is_saved = False
 
+    def start_journal(self, path):
+        """Starts a new journal at path holding the current drawing, the
+        previous journal is removed as the new one replaces it"""
+        self.stop_journal(remove=True)
+        self.journal = journal.Journal(path)
+        self.journal.open()
+        self.journal_snapshot()
+
+    def stop_journal(self, remove=False):
+        if self.journal is None:
+            return
+        self.commit_change()
+        self.journal.close(remove)
+        self.journal = None
+
+    def journal_snapshot(self):
+        self.end_stroke()
+        if self.journal is None:
+            return
+        self._open_change = None
+        self.__journal_drawing()
+
+    def __journal_drawing(self):
+        # The copy shares the tiles, the text is made on the writer thread
+        grid = self.drawing.copy()
+        self.journal.append(journal.SNAPSHOT, lambda: journal.pack_snapshot(grid.width, grid.height, grid.get_text()))
+
+    def begin_stroke(self, undo_name):
+        """Starts an undo action whose cells are buffered until
+        end_stroke and then stored as one packed change"""
+        self.add_undo_action(undo_name)
+        self.stroke = Stroke()
+
+    def end_stroke(self):
+        if self.stroke is None:
+            return
+        change = self._open_change
+        stroke = self.stroke
+        self.stroke = None
+        if change is None:
+            return
+        stroke.merge_into(change)
+        self.commit_change()
+        change.pack()
+
+    def commit_change(self):
+        """Writes the change being recorded to the journal, it can't
+        be recorded to after this"""
+        if self.stroke is not None:
+            self.end_stroke()
+            return
+        if self._open_change is None:
+            return
+        change = self._open_change
+        self._open_change = None
+        self.__journal_change(change)
+
+    def __journal_change(self, change):
+        # The journal keeps the cells as they are after the change
+        if self.journal is None or len(change) == 0:
+            return
+        if change.grid is not None:
+            self.__journal_drawing()
+            return
+        after = Change(change.name)
+        for region in change.regions:
+            after.add_region(RegionSnapshot.capture(
+                self.drawing, region.x, region.y, region.width, region.height, region.mask))
+        for x, y, char in change.changes:
+            if self.drawing.in_bounds(x, y):
+                after.add_change(x, y, self.drawing.get_char_at(x, y))
+        self.journal.append(journal.CHANGE, after.to_bytes)
+
+    def recover_journal(self, path):
+        """Replaces the drawing with the one recorded in the journal at
+        path as an undoable action, returns False if there was nothing
+        to recover"""
+        records = list(journal.read_journal(path))
+        if not records:
+            return False
+
+        self.add_undo_action(_("Recover"))
+        self.record_grid()
+        for kind, payload in records:
+            if kind == journal.SNAPSHOT:
+                width, height, text = journal.unpack_snapshot(payload)
+                self.drawing.fill()
+                self.__resize(width, height)
+                self.drawing.set_region(0, 0, text.split('\n'))
+            elif kind == journal.CHANGE:
+                change = Change.from_bytes(payload)
+                for region in change.regions:
+                    region.restore(self.drawing)
+                for x, y, char in change.changes:
+                    self.drawing.set_char_at(x, y, char)
+
+        self.is_saved = False
+        self.journal_snapshot()
+        self.damage_all()
+        self.update()
+        return True
+
+    def trim_history(self):
+        """Compresses the changes away from the current node and evicts
+        the oldest until the history fits its limits, the current change
+        is kept"""
+        recent = set(map(id, itertools.islice(self.history.ancestors(), self.history_unpacked_steps)))
+        for node in self.history.nodes():
+            if id(node) not in recent:
+                for change in node.changes():
+                    change.pack()
+
+        evicted = False
+        while len(self.history) > self._history_max_steps or self.history_size() > self._history_max_bytes:
+            if not self.history.evict():
+                break
+            evicted = True
+        if evicted:
+            self.emit('undo-evicted')
+
+    def history_size(self):
+        return sum(change.memory_size() for node in self.history.nodes() for change in node.changes())
+
     def get_char_at(self, x: int, y: int, draw=True):
-        if y >= len(self.drawing) or x >= len(self.drawing[0]) or x < 0 or y < 0: return
-        if draw:
-            return self.drawing[int(y)][int(x)]
-        return self.preview[int(y)][int(x)]
+        _layer = self.drawing if draw else self.preview
+        return _layer.get_char_at(x, y)
+
+    def get_region(self, x, y, width, height, draw=True):
+        _layer = self.drawing if draw else self.preview
+        return _layer.get_region(x, y, width, height)
 
     def set_selected_char(self, char):
         if self._primary_selected:
@@ -255,26 +686,23 @@ class Canvas(Adw.Bin):
     def __draw_text(self, start_x, start_y, text, transparent, draw, _layer):
         lines = text.splitlines()
         max_line_length = max(len(line) for line in lines)
-        array2 = [list(line.ljust(max_line_length)) for line in lines]
-        # array2 = [list(line) for line in lines]
-
-        rows1, cols1 = len(_layer), len(_layer[0])
-        rows2, cols2 = len(array2), len(array2[0])
+        array2 = [line.ljust(max_line_length) for line in lines]
 
-        if start_x >= cols1 or start_y >= rows1:
+        if start_x >= _layer.width or start_y >= _layer.height:
             return
 
-        for i in range(rows2):
-            for j in range(cols2):
-                new_i, new_j = i + start_y, j + start_x
-
-                if 0 <= new_i < rows1 and 0 <= new_j < cols1:
-                    if transparent and array2[i][j] == " ":
+        if draw:
+            for i, line in enumerate(array2):
+                for j, char in enumerate(line):
+                    if transparent and char == " ":
                         continue
-                    if draw:
-                        prev_char = self.get_char_at(new_j, new_i)
-                        self.undo_changes[-1].add_change(new_j, new_i, prev_char)
-                    _layer[int(new_i)][int(new_j)] = array2[i][j]
+                    prev_char = _layer.get_char_at(j + start_x, i + start_y)
+                    if prev_char is not None:
+                        self.history.current.undo.add_change(j + start_x, i + start_y, prev_char)
+
+        _layer.set_region(start_x, start_y, array2, transparent)
+        if _layer is self.drawing:
+            self.damage(start_x, start_y, max_line_length, len(array2))
 
     def draw_rectangle(self, start_x_char, start_y_char, width, height, draw):
         if width <= 1 or height <= 1:
@@ -315,119 +743,99 @@ class Canvas(Adw.Bin):
                 self.set_char_at(x, start_y + y, char, draw)
 
     def set_char_at(self, x, y, char, draw):
-        _layer = self.drawing if draw else self.preview
-
         if char == "":
             char = " "
 
-        if y >= len(_layer) or x >= len(_layer[0]) or x < 0 or y < 0:
-            return
         if draw:
-            prev_char = self.get_char_at(x, y)
-            self.undo_changes[-1].add_change(x, y, prev_char)
-        _layer[int(y)][int(x)] = char
+            self.__write_char(x, y, char)
+        else:
+            self.preview.set_char_at(x, y, char)
 
-    def draw_at(self, x, y):
-        if y >= len(self.drawing) or x >= len(self.drawing[0]) or x < 0 or y < 0:
+    def __write_char(self, x, y, char):
+        # Writes on the drawing recording the undo and the damaged cell
+        prev_char = self.drawing.get_char_at(x, y)
+        if prev_char is None or prev_char == char:
             return
-        prev_char = self.get_char_at(x, y)
-        self.undo_changes[-1].add_change(x, y, prev_char)
-        self.drawing[int(y)][int(x)] = self.get_selected_char()
+        if self.stroke is not None:
+            self.stroke.record(x, y, prev_char)
+        else:
+            self.history.current.undo.add_change(x, y, prev_char)
+        self.drawing.set_char_at(x, y, char)
+        self.damage(x, y)
+
+    def draw_at(self, x, y):
+        self.__write_char(x, y, self.get_selected_char())
 
     def draw_inverted_at(self, x, y):
-        if y >= len(self.drawing) or x >= len(self.drawing[0]) or x < 0 or y < 0:
-            return
-        prev_char = self.get_char_at(x, y)
-        self.undo_changes[-1].add_change(x, y, prev_char)
-        self.drawing[int(y)][int(x)] = self.get_unselected_char()
+        self.__write_char(x, y, self.get_unselected_char())
 
     def draw_primary_at(self, x, y, draw):
-        _layer = self.drawing if draw else self.preview
-
-        if y >= len(_layer) or x >= len(_layer[0]) or x < 0 or y < 0:
-            return
-        if draw:
-            prev_char = self.get_char_at(x, y)
-            self.undo_changes[-1].add_change(x, y, prev_char)
-        _layer[int(y)][int(x)] = self.primary_char
+        self.set_char_at(x, y, self.primary_char, draw)
 
     def draw_secondary_at(self, x, y, draw):
-        _layer = self.drawing if draw else self.preview
-
-        if y >= len(_layer) or x >= len(_layer[0]) or x < 0 or y < 0:
-            return
-        if draw:
-            prev_char = self.get_char_at(x, y)
-            self.undo_changes[-1].add_change(x, y, prev_char)
-        _layer[int(y)][int(x)] = self.secondary_char
+        self.set_char_at(x, y, self.secondary_char, draw)
 
     def clear_preview(self):
-        self.preview = []
-        for y in range(self.canvas_height):
-            new_line = []
-            for x in range(self.canvas_width):
-                new_line.append(" ")
-            self.preview.append(new_line)
+        # The redraw is queued even when the preview is already empty,
+        # tools draw their next preview right after clearing it
+        if len(self.preview) != 0:
+            self.preview.fill()
 
         self.preview_drawing_area.queue_draw()
 
     def clear_canvas(self):
-        for y in range(self.canvas_height):
-            for x in range(self.canvas_width):
-                self.set_char_at(x, y, "", True)
+        self.record_region(0, 0, self.canvas_width, self.canvas_height)
+        self.drawing.fill()
+        self.damage_all()
 
-        self.draw_drawing_area.queue_draw()
+        self.update()
 
     def wipe_canvas(self):
-        for y in range(self.canvas_height):
-            for x in range(self.canvas_width):
-                if y >= len(self.drawing) or x >= len(self.drawing[0]) or x < 0 or y < 0:
-                    return
-                self.drawing[int(y)][int(x)] = ""
+        self.drawing.fill()
+        self.journal_snapshot()
 
-        self.draw_drawing_area.queue_draw()
-
-    def change_canvas_size(self, final_x, final_y):
-        content = self.get_content()
+        self.damage_all()
+        self.update()
 
-        self.drawing = []
-        self.preview = []
+    def change_canvas_size(self, final_x, final_y, record=False):
+        """Resizes the drawing, with record the previous one is kept in
+        the current undo action"""
+        if record:
+            self.record_grid()
+        self.__resize(final_x, final_y)
+        self.journal_snapshot()
 
-        self.canvas_width = final_x
-        self.canvas_height = final_y
+    def __resize(self, final_x, final_y):
+        self.canvas_width = max(min(final_x, self.canvas_max_x), 1)
+        self.canvas_height = max(min(final_y, self.canvas_max_y), 1)
 
-        for y in range(self.canvas_height):
-            new_line = []
-            for x in range(self.canvas_width):
-                new_line.append(" ")
-            self.drawing.append(new_line)
-            self.preview.append(new_line)
+        self.drawing.resize(self.canvas_width, self.canvas_height)
+        self.preview.resize(self.canvas_width, self.canvas_height)
 
         self.draw_drawing_area.set_size_request(self.canvas_width*self.x_mul, self.canvas_height*self.y_mul)
-
-        self.__draw_text(0, 0, content, False, False, self.drawing)
+        self.damage_all()
 
     def get_content(self):
-        content = ""
-
-        for index, line in enumerate(self.drawing):
-            line_string = ''.join(w if w != "" else " " for w in line)
-            content += line_string + "\n"
-
-        return content
-
-    def set_content(self, content):
-        self.wipe_canvas()
+        return self.drawing.get_text()
+
+    def set_content(self, content, record=False):
+        """Replaces the drawing with content, returns False if it had
+        to be cut to fit the maximum canvas size. With record the
+        previous drawing is kept in the current undo action"""
+        if record:
+            self.record_grid()
+        self.drawing.fill()
         lines = content.split('\n')
         num_lines = len(lines)
         max_chars = max(len(line) for line in lines)
-        # if num_lines > self.canvas_max_x or max_chars > self.canvas_max_y:
-        #     toast = Adw.Toast(title=_("Opened file exceeds the maximum canvas size"))
-        #     self.toast_overlay.add_toast(toast)
-        self.change_canvas_size(max(max_chars, 10), max(num_lines - 1, 5))
+        fits = max_chars <= self.canvas_max_x and num_lines - 1 <= self.canvas_max_y
+        self.__resize(max(max_chars, 10), max(num_lines - 1, 5))
         self.clear_preview()
         self.__draw_text(0, 0, content, False, False, self.drawing)
+        self.journal_snapshot()
+        self.damage_all()
         self.update()
+        return fits
 
     def top_horizontal(self):
         return self.styles[self._style - 1][0]
@@ -0,0 +1,325 @@
+# flood.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import re
+from bisect import bisect_right
+
+
+class RowRuns():
+    """The runs of a character on every row of a layer, found with one
+    regular expression search per row the first time a row is needed"""
+
+    def __init__(self, layer, char):
+        self.layer = layer
+        self.pattern = re.compile(re.escape(char) + '+')
+        self.rows = {}
+
+    def get(self, y):
+        """Returns the starts and the ends of the runs on row y"""
+        runs = self.rows.get(y)
+        if runs is None:
+            starts = []
+            ends = []
+            for match in self.pattern.finditer(self.layer.get_row(y)):
+                starts.append(match.start())
+                ends.append(match.end())
+            runs = self.rows[y] = (starts, ends)
+        return runs
+
+    def find(self, x, y):
+        """Returns the index of the run covering x on row y or None"""
+        starts, ends = self.get(y)
+        index = bisect_right(starts, x) - 1
+        if index >= 0 and ends[index] > x:
+            return index
+        return None
+
+    def overlapping(self, y, start, end):
+        """Yields the index of every run on row y overlapping start, end"""
+        starts, ends = self.get(y)
+        index = max(bisect_right(starts, start) - 1, 0)
+        while index < len(starts) and starts[index] < end:
+            if ends[index] > start:
+                yield index
+            index += 1
+
+
+def span_fill(layer, start_x, start_y):
+    """Returns the spans of the area of equal characters around
+    start_x, start_y as y, start and end, filling whole runs of the
+    character at a time instead of single cells"""
+    target = layer.get_char_at(start_x, start_y)
+    if target is None:
+        return []
+
+    runs = RowRuns(layer, target)
+    first = runs.find(int(start_x), int(start_y))
+    visited = {(int(start_y), first)}
+    stack = [(int(start_y), first)]
+    spans = []
+
+    while stack:
+        y, index = stack.pop()
+        starts, ends = runs.get(y)
+        start, end = starts[index], ends[index]
+        spans.append((y, start, end))
+
+        for row in (y - 1, y + 1):
+            if row < 0 or row >= layer.height:
+                continue
+            for neighbour in runs.overlapping(row, start, end):
+                if (row, neighbour) not in visited:
+                    visited.add((row, neighbour))
+                    stack.append((row, neighbour))
+
+    spans.sort()
+    return spans
+
+
+def match_spans(layer, char, x=0, y=0, width=None, height=None):
+    """Returns the spans of every run of char inside the rectangle,
+    the whole layer by default"""
+    if width is None:
+        width = layer.width - x
+    if height is None:
+        height = layer.height - y
+    left = max(int(x), 0)
+    right = min(int(x + width), layer.width)
+    pattern = re.compile(re.escape(char) + '+')
+    spans = []
+    if left >= right:
+        return spans
+    for row in range(max(int(y), 0), min(int(y + height), layer.height)):
+        for match in pattern.finditer(layer.get_row(row, left, right)):
+            spans.append((row, left + match.start(), left + match.end()))
+    return spans
+
+
+def spans_mask(spans):
+    """Returns the bounding box of spans as x, y, width, height and a
+    mask with a byte set for every cell of the spans"""
+    left = min(start for y, start, end in spans)
+    right = max(end for y, start, end in spans)
+    top = spans[0][0]
+    bottom = spans[-1][0] + 1
+    width = right - left
+    mask = bytearray(width * (bottom - top))
+    for y, start, end in spans:
+        offset = (y - top) * width - left
+        mask[offset + start:offset + end] = b'\x01' * (end - start)
+    return left, top, width, bottom - top, bytes(mask)
+
+
+def pattern_texts(spans, pattern):
+    """Returns the text of every span tiled with the rows of pattern,
+    the tiling starts at the top left corner of the layer so fills next
+    to each other line up"""
+    width = max(len(row) for row in pattern)
+    right = max(end for y, start, end in spans)
+    repeats = right // width + 1
+    lines = [row.ljust(width) * repeats for row in pattern]
+    return [lines[y % len(lines)][start:end] for y, start, end in spans]
+
+
+def gradient_texts(spans, ramp, vertical=False):
+    """Returns the text of every span shaded with ramp from its first
+    character on the left or top of the spans to its last on the right
+    or bottom"""
+    steps = len(ramp) - 1
+    if vertical:
+        top = spans[0][0]
+        height = max(spans[-1][0] - top, 1)
+        return [ramp[int((y - top) / height * steps)] * (end - start) for y, start, end in spans]
+    left = min(start for y, start, end in spans)
+    right = max(end for y, start, end in spans)
+    width = max(right - left - 1, 1)
+    line = ''.join(ramp[int(x / width * steps)] for x in range(right - left))
+    return [line[start - left:end - left] for y, start, end in spans]
+
+# A run of equal characters, any character
+RUN_PATTERN = re.compile(r'(.)\1*', re.DOTALL)
+
+
+class Component():
+    """An area of equal characters connected by their sides, its size
+    and bounds are measured the first time they are needed"""
+
+    def __init__(self, char, spans):
+        self.char = char
+        self.spans = spans
+        self._size = None
+        self._bounds = None
+
+    def __repr__(self):
+        return f"Component of {self.size} {self.char!r} in {self.bounds}"
+
+    @property
+    def size(self):
+        if self._size is None:
+            self._size = sum(end - start for y, start, end in self.spans)
+        return self._size
+
+    @property
+    def bounds(self):
+        """The bounding box as x, y, width and height"""
+        if self._bounds is None:
+            left = min(start for y, start, end in self.spans)
+            right = max(end for y, start, end in self.spans)
+            top = self.spans[0][0]
+            self._bounds = (left, top, right - left, self.spans[-1][0] + 1 - top)
+        return self._bounds
+
+    def touches(self, x, y, width, height):
+        """Whether a change in the rectangle could change the component,
+        which is the case for cells in it or next to it"""
+        left, top, component_width, component_height = self.bounds
+        return (x <= left + component_width and x + width >= left
+                and y <= top + component_height and y + height >= top)
+
+
+class ComponentIndex():
+    """Labels the connected areas of equal characters of a layer. The
+    whole layer is labeled at once with a union-find over the runs of
+    every row, changes only drop the components next to them and those
+    are labeled again when asked for"""
+
+    def __init__(self, layer):
+        self.reset(layer)
+
+    def __repr__(self):
+        return f"ComponentIndex with {len(self.components)} components"
+
+    def reset(self, layer=None):
+        if layer is not None:
+            self.layer = layer
+        self.built = False
+        self.components = {}
+        # Per row the starts, the ends and the component ids of the
+        # labeled spans, sorted by start
+        self.rows = {}
+        self.next_id = 0
+
+    def component_at(self, x, y):
+        if not self.layer.in_bounds(x, y):
+            return None
+        x, y = int(x), int(y)
+        if not self.built:
+            self.__build()
+        component_id = self.__label_at(x, y)
+        if component_id is None:
+            spans = span_fill(self.layer, x, y)
+            component_id = self.__add(Component(self.layer.get_char_at(x, y), spans))
+        return self.components[component_id]
+
+    def invalidate(self, x, y, width=1, height=1):
+        """Drops the components a change in the rectangle could affect"""
+        if not self.built:
+            return
+        dropped = set()
+        for row in range(y - 1, y + height + 1):
+            labels = self.rows.get(row)
+            if labels is None:
+                continue
+            starts, ends, ids = labels
+            index = max(bisect_right(starts, x - 1) - 1, 0)
+            while index < len(starts) and starts[index] <= x + width:
+                if ends[index] >= x:
+                    dropped.add(ids[index])
+                index += 1
+        for component_id in dropped:
+            self.__remove(component_id)
+
+    def __label_at(self, x, y):
+        labels = self.rows.get(y)
+        if labels is None:
+            return None
+        starts, ends, ids = labels
+        index = bisect_right(starts, x) - 1
+        if index >= 0 and ends[index] > x:
+            return ids[index]
+        return None
+
+    def __add(self, component):
+        component_id = self.next_id
+        self.next_id += 1
+        self.components[component_id] = component
+        for y, start, end in component.spans:
+            starts, ends, ids = self.rows.setdefault(y, ([], [], []))
+            index = bisect_right(starts, start)
+            starts.insert(index, start)
+            ends.insert(index, end)
+            ids.insert(index, component_id)
+        return component_id
+
+    def __remove(self, component_id):
+        component = self.components.pop(component_id)
+        for y in {y for y, start, end in component.spans}:
+            starts, ends, ids = self.rows[y]
+            keep = [index for index, other in enumerate(ids) if other != component_id]
+            self.rows[y] = ([starts[i] for i in keep], [ends[i] for i in keep], [ids[i] for i in keep])
+
+    def __build(self):
+        runs = []
+        for y in range(self.layer.height):
+            runs.append([(match.start(), match.end(), match.group(1))
+                         for match in RUN_PATTERN.finditer(self.layer.get_row(y))])
+
+        # One id per run, numbered row after row
+        offsets = [0]
+        for row in runs:
+            offsets.append(offsets[-1] + len(row))
+        parents = list(range(offsets[-1]))
+
+        def find(run):
+            while parents[run] != run:
+                parents[run] = parents[parents[run]]
+                run = parents[run]
+            return run
+
+        for y in range(1, len(runs)):
+            above = runs[y - 1]
+            below = runs[y]
+            i = j = 0
+            while i < len(above) and j < len(below):
+                if above[i][2] == below[j][2] and above[i][0] < below[j][1] and below[j][0] < above[i][1]:
+                    root_above = find(offsets[y - 1] + i)
+                    root_below = find(offsets[y] + j)
+                    if root_above != root_below:
+                        parents[root_below] = root_above
+                if above[i][1] < below[j][1]:
+                    i += 1
+                else:
+                    j += 1
+
+        # Components are numbered by their root run, the rows are
+        # labeled in order without searching
+        roots = {}
+        for y, row in enumerate(runs):
+            starts, ends, ids = self.rows[y] = ([], [], [])
+            for index, (start, end, char) in enumerate(row):
+                root = find(offsets[y] + index)
+                if root not in roots:
+                    roots[root] = (char, [])
+                roots[root][1].append((y, start, end))
+                starts.append(start)
+                ends.append(end)
+                ids.append(root)
+        self.components = {root: Component(char, spans) for root, (char, spans) in roots.items()}
+        self.next_id = offsets[-1]
+        self.built = True
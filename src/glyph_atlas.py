@@ -0,0 +1,102 @@
+# glyph_atlas.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import math
+import cairo
+
+
+class GlyphAtlas():
+    """Keeps every character rendered once as a small surface so the
+    canvas can stamp cells instead of shaping text on every paint"""
+
+    def __init__(self, cell_width, cell_height):
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+
+        self.font_size = 0
+        self.color = 0
+        self.device_scale = 1
+
+        self.glyphs = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return f"GlyphAtlas with {len(self.glyphs)} glyphs, {self.hits} hits and {self.misses} misses"
+
+    def configure(self, font_size, color, device_scale=1, cell_height=None):
+        """Drops the cached glyphs when they would be drawn differently"""
+        if cell_height is None:
+            cell_height = self.cell_height
+        if (font_size, color, device_scale, cell_height) != (
+                self.font_size, self.color, self.device_scale, self.cell_height):
+            self.font_size = font_size
+            self.color = color
+            self.device_scale = device_scale
+            self.cell_height = cell_height
+            self.invalidate()
+
+    def invalidate(self):
+        self.glyphs = {}
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get_glyph(self, char):
+        key = (char, self.font_size, self.color)
+        glyph = self.glyphs.get(key)
+        if glyph is not None:
+            self.hits += 1
+            return glyph
+        self.misses += 1
+        glyph = self.glyphs[key] = self.__render(char)
+        return glyph
+
+    def stamp(self, cr, char, x, y):
+        """Paints char in the cell whose top left corner is x, y"""
+        surface, width = self.get_glyph(char)
+        cr.set_source_surface(surface, x, y)
+        cr.rectangle(x, y, width, self.cell_height)
+        cr.fill()
+
+    def __render(self, char):
+        measure_cr = cairo.Context(cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1))
+        measure_cr.select_font_face("monospace")
+        measure_cr.set_font_size(self.font_size)
+        extents = measure_cr.text_extents(char)
+
+        # Wide glyphs keep painting over the next cells like show_text does
+        width = max(self.cell_width, math.ceil(max(extents.x_advance, extents.x_bearing + extents.width)))
+
+        surface = cairo.ImageSurface(
+            cairo.FORMAT_ARGB32,
+            math.ceil(width * self.device_scale),
+            math.ceil(self.cell_height * self.device_scale))
+        surface.set_device_scale(self.device_scale, self.device_scale)
+
+        cr = cairo.Context(surface)
+        cr.set_source_rgb(self.color, self.color, self.color)
+        cr.select_font_face("monospace")
+        cr.set_font_size(self.font_size)
+        cr.move_to(0, self.cell_height - 5)
+        cr.show_text(char)
+
+        return surface, width
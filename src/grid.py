@@ -0,0 +1,417 @@
+# grid.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import array as _array
+from array import array
+from itertools import groupby
+
+# 'u' is deprecated since Python 3.13 in favour of 'w', both store
+# one code point per item
+TYPECODE = 'w' if 'w' in _array.typecodes else 'u'
+
+
+def blank_cells(length, char=' '):
+    return array(TYPECODE, char * length)
+
+
+TILE_WIDTH = 64
+TILE_HEIGHT = 32
+
+# Shared by every tile that was never written, it must never be modified
+BLANK_TILE = blank_cells(TILE_WIDTH * TILE_HEIGHT)
+
+
+class Layer():
+    """Operations shared by the cell storages, subclasses provide
+    get_char_at, set_char_at, get_row, set_row, fill and resize"""
+
+    width = 0
+    height = 0
+
+    @classmethod
+    def from_lines(cls, lines, width, height):
+        grid = cls(width, height)
+        grid.set_region(0, 0, lines)
+        return grid
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def fill_row(self, y, start, end, char):
+        self.set_row(y, char * (end - start), start)
+
+    def get_region(self, x, y, width, height):
+        """Returns the rows of the given rectangle as strings, cells
+        outside the grid read as blanks"""
+        x, y, width, height = int(x), int(y), int(width), int(height)
+        left = max(x, 0)
+        right = min(x + width, self.width)
+        region = []
+        for row in range(y, y + height):
+            if row < 0 or row >= self.height or left >= right:
+                region.append(' ' * max(width, 0))
+                continue
+            line = self.get_row(row, left, right)
+            region.append(' ' * (left - x) + line + ' ' * (x + width - right))
+        return region
+
+    def set_region(self, x, y, lines, transparent=False):
+        """Writes lines starting at x, y, with transparent blanks
+        leave the cells below them untouched"""
+        for index, line in enumerate(lines):
+            if not transparent:
+                self.set_row(y + index, line, x)
+                continue
+            column = 0
+            for part in line.split(' '):
+                if part:
+                    self.set_row(y + index, part, x + column)
+                column += len(part) + 1
+
+    def iter_rows(self, top=0, bottom=None):
+        """Yields y and the text of the rows from top to bottom that may
+        not be blank"""
+        if bottom is None:
+            bottom = self.height
+        for y in range(max(top, 0), min(bottom, self.height)):
+            yield y, self.get_row(y)
+
+    def get_text(self):
+        return ''.join(self.get_row(y) + '\n' for y in range(self.height))
+
+
+class Grid(Layer):
+    """A dense block of single character cells stored row after row
+    in one flat array, row y starts at y * width"""
+
+    def __init__(self, width, height, fill=' '):
+        self.width = width
+        self.height = height
+        self._cells = blank_cells(width * height, fill)
+
+    def __repr__(self):
+        return f"Grid of {self.width}x{self.height} cells"
+
+    def get_char_at(self, x, y):
+        if not self.in_bounds(x, y):
+            return None
+        return self._cells[int(y) * self.width + int(x)]
+
+    def set_char_at(self, x, y, char):
+        if not self.in_bounds(x, y):
+            return False
+        self._cells[int(y) * self.width + int(x)] = char or ' '
+        return True
+
+    def get_row(self, y, start=0, end=None):
+        if end is None:
+            end = self.width
+        offset = int(y) * self.width
+        return self._cells[offset + start:offset + end].tounicode()
+
+    def set_row(self, y, text, start=0):
+        """Writes text on row y starting at column start, clipping
+        what falls outside the grid"""
+        y = int(y)
+        start = int(start)
+        if y < 0 or y >= self.height:
+            return
+        if start < 0:
+            text = text[-start:]
+            start = 0
+        text = text[:self.width - start]
+        if not text:
+            return
+        offset = y * self.width + start
+        self._cells[offset:offset + len(text)] = array(TYPECODE, text)
+
+    def fill(self, char=' '):
+        self._cells = blank_cells(self.width * self.height, char)
+
+    def resize(self, width, height):
+        """Changes the size keeping the content in the top left corner"""
+        cells = blank_cells(width * height)
+        copy_width = min(width, self.width)
+        for y in range(min(height, self.height)):
+            old = y * self.width
+            new = y * width
+            cells[new:new + copy_width] = self._cells[old:old + copy_width]
+        self._cells = cells
+        self.width = width
+        self.height = height
+
+    def copy(self):
+        grid = Grid(0, 0)
+        grid.width = self.width
+        grid.height = self.height
+        grid._cells = array(TYPECODE, self._cells)
+        return grid
+
+
+class TiledGrid(Layer):
+    """Stores the cells in TILE_WIDTH x TILE_HEIGHT tiles that are only
+    allocated once something other than a blank is written in them, so
+    memory and resizing scale with the content instead of the area.
+
+    Copies share their tiles, a grid only writes in place in the tiles
+    it owns and copies the others before the first write"""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self._tiles = {}
+        self._owned = set()
+
+    def __repr__(self):
+        return (f"TiledGrid of {self.width}x{self.height} cells "
+                f"with {len(self._tiles)} tiles")
+
+    def get_char_at(self, x, y):
+        if not self.in_bounds(x, y):
+            return None
+        x, y = int(x), int(y)
+        tile = self._tiles.get((x // TILE_WIDTH, y // TILE_HEIGHT), BLANK_TILE)
+        return tile[(y % TILE_HEIGHT) * TILE_WIDTH + x % TILE_WIDTH]
+
+    def set_char_at(self, x, y, char):
+        if not self.in_bounds(x, y):
+            return False
+        x, y = int(x), int(y)
+        char = char or ' '
+        key = (x // TILE_WIDTH, y // TILE_HEIGHT)
+        if key not in self._tiles and char == ' ':
+            return True
+        tile = self.__writable_tile(key)
+        tile[(y % TILE_HEIGHT) * TILE_WIDTH + x % TILE_WIDTH] = char
+        return True
+
+    def __writable_tile(self, key):
+        # Allocates the tile or copies it if it is shared
+        tile = self._tiles.get(key)
+        if key in self._owned:
+            return tile
+        if tile is None:
+            tile = blank_cells(TILE_WIDTH * TILE_HEIGHT)
+        else:
+            tile = array(TYPECODE, tile)
+        self._tiles[key] = tile
+        self._owned.add(key)
+        return tile
+
+    def get_row(self, y, start=0, end=None):
+        if end is None:
+            end = self.width
+        if start >= end:
+            return ''
+        tile_y, offset = divmod(int(y), TILE_HEIGHT)
+        offset *= TILE_WIDTH
+        parts = []
+        for tile_x in range(start // TILE_WIDTH, (end - 1) // TILE_WIDTH + 1):
+            left = max(start - tile_x * TILE_WIDTH, 0)
+            right = min(end - tile_x * TILE_WIDTH, TILE_WIDTH)
+            tile = self._tiles.get((tile_x, tile_y))
+            if tile is None:
+                parts.append(' ' * (right - left))
+            else:
+                parts.append(tile[offset + left:offset + right].tounicode())
+        return ''.join(parts)
+
+    def set_row(self, y, text, start=0):
+        """Writes text on row y starting at column start, clipping
+        what falls outside the grid"""
+        y = int(y)
+        start = int(start)
+        if y < 0 or y >= self.height:
+            return
+        if start < 0:
+            text = text[-start:]
+            start = 0
+        text = text[:self.width - start]
+        tile_y, offset = divmod(y, TILE_HEIGHT)
+        offset *= TILE_WIDTH
+        x = start
+        while text:
+            tile_x, left = divmod(x, TILE_WIDTH)
+            part = text[:TILE_WIDTH - left]
+            text = text[len(part):]
+            x += len(part)
+            if (tile_x, tile_y) not in self._tiles and not part.strip(' '):
+                continue
+            tile = self.__writable_tile((tile_x, tile_y))
+            tile[offset + left:offset + left + len(part)] = array(TYPECODE, part)
+
+    def fill(self, char=' '):
+        self._tiles = {}
+        self._owned = set()
+        if char == ' ':
+            return
+        for tile_y in range((self.height - 1) // TILE_HEIGHT + 1):
+            for y in range(tile_y * TILE_HEIGHT, min((tile_y + 1) * TILE_HEIGHT, self.height)):
+                self.set_row(y, char * self.width)
+
+    def resize(self, width, height):
+        """Changes the size keeping the content in the top left corner,
+        tiles that end up outside are dropped and the cells cut off from
+        the edge tiles are blanked"""
+        for key in list(self._tiles):
+            tile_x, tile_y = key
+            left = tile_x * TILE_WIDTH
+            top = tile_y * TILE_HEIGHT
+            if left >= width or top >= height:
+                del self._tiles[key]
+                self._owned.discard(key)
+                continue
+            # Cells past the old edges are blank already
+            keep_width = min(width - left, TILE_WIDTH)
+            cut_width = keep_width < min(self.width - left, TILE_WIDTH)
+            keep_height = min(height - top, TILE_HEIGHT)
+            cut_height = keep_height < min(self.height - top, TILE_HEIGHT)
+            if not cut_width and not cut_height:
+                continue
+            tile = self.__writable_tile(key)
+            if cut_width:
+                blank = blank_cells(TILE_WIDTH - keep_width)
+                for row in range(TILE_HEIGHT):
+                    offset = row * TILE_WIDTH
+                    tile[offset + keep_width:offset + TILE_WIDTH] = blank
+            if cut_height:
+                tile[keep_height * TILE_WIDTH:] = blank_cells((TILE_HEIGHT - keep_height) * TILE_WIDTH)
+        self.width = width
+        self.height = height
+
+    def iter_tiles(self):
+        """Yields x, y, width, height and the rows of every allocated
+        tile, clipped to the grid, blank tiles are skipped"""
+        for (tile_x, tile_y), tile in sorted(self._tiles.items(), key=lambda item: (item[0][1], item[0][0])):
+            left = tile_x * TILE_WIDTH
+            top = tile_y * TILE_HEIGHT
+            width = min(TILE_WIDTH, self.width - left)
+            height = min(TILE_HEIGHT, self.height - top)
+            rows = [tile[row * TILE_WIDTH:row * TILE_WIDTH + width].tounicode() for row in range(height)]
+            yield left, top, width, height, rows
+
+    def iter_rows(self, top=0, bottom=None):
+        if bottom is None:
+            bottom = self.height
+        for tile_y in sorted({tile_y for tile_x, tile_y in self._tiles}):
+            start = max(tile_y * TILE_HEIGHT, top)
+            end = min((tile_y + 1) * TILE_HEIGHT, self.height, bottom)
+            for y in range(start, end):
+                yield y, self.get_row(y)
+
+    def get_text(self):
+        """Returns the rows joined with newlines, the rows are built from
+        the allocated tiles so blank tiles are never read"""
+        blank_line = ' ' * self.width + '\n'
+        lines = []
+        done = 0
+        for top, tiles in groupby(self.iter_tiles(), key=lambda tile: tile[1]):
+            tiles = list(tiles)
+            lines.append(blank_line * (top - done))
+            for row in range(tiles[0][3]):
+                parts = []
+                column = 0
+                for left, _top, width, _height, rows in tiles:
+                    parts.append(' ' * (left - column))
+                    parts.append(rows[row])
+                    column = left + width
+                parts.append(' ' * (self.width - column) + '\n')
+                lines.append(''.join(parts))
+            done = top + tiles[0][3]
+        lines.append(blank_line * (self.height - done))
+        return ''.join(lines)
+
+    def copy(self):
+        """Returns a grid sharing the tiles, copying a tile is left to
+        the first write in it from either grid"""
+        grid = TiledGrid(self.width, self.height)
+        grid._tiles = dict(self._tiles)
+        self._owned = set()
+        return grid
+
+    def memory_size(self):
+        return len(self._tiles) * TILE_WIDTH * TILE_HEIGHT * BLANK_TILE.itemsize
+
+
+class Overlay(Layer):
+    """A sparse layer that only keeps the cells written since it was
+    last cleared, blanks are not stored so clearing and painting cost
+    as much as the cells a tool touched"""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self._cells = {}
+
+    def __repr__(self):
+        return (f"Overlay of {self.width}x{self.height} cells "
+                f"with {len(self._cells)} set")
+
+    def __len__(self):
+        return len(self._cells)
+
+    def get_char_at(self, x, y):
+        if not self.in_bounds(x, y):
+            return None
+        return self._cells.get((int(x), int(y)), ' ')
+
+    def set_char_at(self, x, y, char):
+        if not self.in_bounds(x, y):
+            return False
+        key = (int(x), int(y))
+        if not char or char == ' ':
+            self._cells.pop(key, None)
+        else:
+            self._cells[key] = char
+        return True
+
+    def get_row(self, y, start=0, end=None):
+        if end is None:
+            end = self.width
+        y = int(y)
+        return ''.join(self._cells.get((x, y), ' ') for x in range(start, end))
+
+    def set_row(self, y, text, start=0):
+        start = int(start)
+        for x, char in enumerate(text, start):
+            if 0 <= x < self.width:
+                self.set_char_at(x, y, char)
+
+    def fill(self, char=' '):
+        self._cells.clear()
+        if char == ' ':
+            return
+        for y in range(self.height):
+            self.set_row(y, char * self.width)
+
+    def resize(self, width, height):
+        self.width = width
+        self.height = height
+        self._cells = {(x, y): char for (x, y), char in self._cells.items()
+                       if x < width and y < height}
+
+    def iter_cells(self):
+        """Yields x, y and the character of every cell that was set"""
+        for (x, y), char in self._cells.items():
+            yield x, y, char
+
+    def copy(self):
+        overlay = Overlay(self.width, self.height)
+        overlay._cells = dict(self._cells)
+        return overlay
@@ -0,0 +1,386 @@
+# history.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import struct
+import sys
+import zlib
+from array import array
+
+# Positions are packed in one int, row y starts at y << POSITION_BITS
+POSITION_BITS = 16
+POSITION_MASK = (1 << POSITION_BITS) - 1
+
+
+# Cell and name counts of a serialized change
+CHANGE_HEADER = struct.Struct('<III')
+# x, y, width, height and mask length of a serialized region
+REGION_HEADER = struct.Struct('<iiiiI')
+
+
+def pack_position(x, y):
+    return (int(y) << POSITION_BITS) | int(x)
+
+
+def unpack_position(position):
+    return position & POSITION_MASK, position >> POSITION_BITS
+
+
+class RegionSnapshot():
+    """A rectangle of cells copied row after row in one string, which
+    takes a byte per cell for ASCII drawings. With a mask only the cells
+    whose mask byte is set belong to the snapshot"""
+
+    def __init__(self, x, y, width, height, cells, mask=None):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.cells = cells
+        self.mask = mask
+
+    @classmethod
+    def capture(cls, layer, x, y, width, height, mask=None):
+        """Copies the rectangle from layer, cells outside it read as
+        blanks"""
+        cells = ''.join(layer.get_region(x, y, width, height))
+        return cls(int(x), int(y), int(width), int(height), cells, mask)
+
+    def __repr__(self):
+        return f"RegionSnapshot of {self.width}x{self.height} cells at {self.x}, {self.y}"
+
+    def __len__(self):
+        if self.mask is None:
+            return len(self.cells)
+        return self.mask.count(1)
+
+    def covers(self, x, y):
+        column = x - self.x
+        row = y - self.y
+        if not (0 <= column < self.width and 0 <= row < self.height):
+            return False
+        return self.mask is None or self.mask[row * self.width + column] == 1
+
+    def restore(self, layer):
+        """Writes the snapshot back on layer one row run at a time"""
+        for row in range(self.height):
+            offset = row * self.width
+            if self.mask is None:
+                layer.set_row(self.y + row, self.cells[offset:offset + self.width], self.x)
+                continue
+            row_mask = self.mask[offset:offset + self.width]
+            start = row_mask.find(1)
+            while start != -1:
+                end = row_mask.find(0, start)
+                if end == -1:
+                    end = self.width
+                layer.set_row(self.y + row, self.cells[offset + start:offset + end], self.x + start)
+                start = row_mask.find(1, end)
+
+    def memory_size(self):
+        size = sys.getsizeof(self) + sys.getsizeof(self.cells)
+        if self.mask is not None:
+            size += sys.getsizeof(self.mask)
+        return size
+
+
+class Stroke():
+    """Buffers the cells overwritten during a drag in two flat arrays,
+    duplicates included, until they are merged in a Change"""
+
+    def __init__(self):
+        self.positions = array('Q')
+        self.chars = array('I')
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __repr__(self):
+        return f"Stroke of {len(self.positions)} cells"
+
+    def record(self, x, y, prev_char):
+        self.positions.append(pack_position(x, y))
+        self.chars.append(ord(prev_char))
+
+    def merge_into(self, change):
+        """Adds the buffered cells to change, the first character
+        buffered for a cell wins"""
+        cells = change.cells
+        for position, code in zip(self.positions, self.chars):
+            if position not in cells:
+                cells[position] = chr(code)
+
+
+class Change():
+    """The cells an undoable action overwrote, keyed by their packed
+    position, only the first character recorded for a cell is kept.
+    Bulk edits record whole regions instead, cells recorded by a
+    region are not recorded again. Changes that replace the whole
+    drawing, like resizing, keep the previous grid by reference"""
+
+    def __init__(self, _name):
+        self.cells = {}
+        self.regions = []
+        self.grid = None
+        self.name = _name
+
+        # Compressed payload while the change is packed
+        self.packed = None
+
+    def add_change(self, x, y, prev_char):
+        if self.grid is not None:
+            return
+        self.unpack()
+        position = pack_position(x, y)
+        if position in self.cells:
+            return
+        for region in self.regions:
+            if region.covers(x, y):
+                return
+        self.cells[position] = prev_char
+
+    def add_region(self, region):
+        if self.grid is not None:
+            return
+        self.unpack()
+        self.regions.append(region)
+
+    def set_grid(self, grid):
+        """Records the whole drawing before the change, what was
+        recorded before is not needed anymore"""
+        if self.grid is not None:
+            return
+        self.unpack()
+        self.grid = grid
+        self.cells = {}
+        self.regions = []
+
+    @property
+    def changes(self):
+        for position, char in self.cells.items():
+            x, y = unpack_position(position)
+            yield x, y, char
+
+    def __len__(self):
+        if self.grid is not None:
+            return self.grid.width * self.grid.height
+        return len(self.cells) + sum(len(region) for region in self.regions)
+
+    def to_bytes(self):
+        """Serializes the name, the cells and the regions"""
+        name = self.name.encode('utf-8')
+        positions = array('Q', self.cells.keys())
+        chars = ''.join(self.cells.values()).encode('utf-32-le')
+        parts = [CHANGE_HEADER.pack(len(name), len(positions), len(self.regions)),
+                 name, positions.tobytes(), chars]
+        for region in self.regions:
+            mask = region.mask or b''
+            parts.append(REGION_HEADER.pack(region.x, region.y, region.width, region.height, len(mask)))
+            parts.append(region.cells.encode('utf-32-le'))
+            parts.append(mask)
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        name_length, cell_count, region_count = CHANGE_HEADER.unpack_from(data)
+        offset = CHANGE_HEADER.size
+        change = cls(bytes(data[offset:offset + name_length]).decode('utf-8'))
+        offset += name_length
+
+        positions = array('Q')
+        positions.frombytes(data[offset:offset + cell_count * positions.itemsize])
+        offset += cell_count * positions.itemsize
+        chars = bytes(data[offset:offset + cell_count * 4]).decode('utf-32-le')
+        offset += cell_count * 4
+        change.cells = dict(zip(positions, chars))
+
+        for _ in range(region_count):
+            x, y, width, height, mask_length = REGION_HEADER.unpack_from(data, offset)
+            offset += REGION_HEADER.size
+            cells = bytes(data[offset:offset + width * height * 4]).decode('utf-32-le')
+            offset += width * height * 4
+            mask = bytes(data[offset:offset + mask_length]) if mask_length else None
+            offset += mask_length
+            change.regions.append(RegionSnapshot(x, y, width, height, cells, mask))
+        return change
+
+    def pack(self):
+        """Compresses the recorded cells, they can't be read until the
+        change is unpacked"""
+        if self.packed is not None or self.grid is not None:
+            return
+        self.packed = zlib.compress(self.to_bytes())
+        self.cells = {}
+        self.regions = []
+
+    def unpack(self):
+        if self.packed is None:
+            return
+        change = Change.from_bytes(zlib.decompress(self.packed))
+        self.cells = change.cells
+        self.regions = change.regions
+        self.packed = None
+
+    def memory_size(self):
+        """Approximate size in bytes of the recorded cells"""
+        if self.packed is not None:
+            return sys.getsizeof(self) + sys.getsizeof(self.packed)
+        if self.grid is not None:
+            # The tiles may still be shared with the drawing
+            return sys.getsizeof(self) + self.grid.memory_size()
+        size = sys.getsizeof(self) + sys.getsizeof(self.cells) + sys.getsizeof(self.regions)
+        for position, char in self.cells.items():
+            size += sys.getsizeof(position) + sys.getsizeof(char)
+        for region in self.regions:
+            size += region.memory_size()
+        return size
+
+    def __repr__(self):
+        return f"The change named {self.name} has {len(self)} changes"
+
+
+class HistoryNode():
+    """A state of the drawing, undo holds what its change overwrote
+    and redo what undoing it overwrote, children branch from it"""
+
+    def __init__(self, parent, change, serial):
+        self.parent = parent
+        self.undo = change
+        self.redo = None
+        self.children = []
+        self.serial = serial
+        self.depth = 0 if parent is None else parent.depth + 1
+
+        # The child redo goes to, the one last visited
+        self.redo_child = None
+
+        # File path of the drawing before and after the change, for the
+        # changes that open a file or replace the drawing with an image
+        self.file_paths = None
+
+    def __repr__(self):
+        return f"HistoryNode {self.serial} {self.undo.name} with {len(self.children)} children"
+
+    @property
+    def name(self):
+        return self.undo.name
+
+    def changes(self):
+        yield self.undo
+        if self.redo is not None:
+            yield self.redo
+
+
+class History():
+    """An undo tree, every node only keeps the deltas to its parent so
+    branches share their common ancestors"""
+
+    def __init__(self):
+        self.serial = 0
+        self.root = HistoryNode(None, Change(""), self.serial)
+        self.current = self.root
+        self.size = 0
+
+    def __repr__(self):
+        return f"History with {self.size} changes"
+
+    def __len__(self):
+        return self.size
+
+    def add(self, change):
+        """Adds change as a new branch after the current node"""
+        self.serial += 1
+        node = HistoryNode(self.current, change, self.serial)
+        self.current.children.append(node)
+        self.current.redo_child = node
+        self.current = node
+        self.size += 1
+        return node
+
+    def can_undo(self):
+        return self.current.parent is not None
+
+    def can_redo(self):
+        return self.current.redo_child is not None
+
+    def nodes(self):
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(node.children)
+
+    def path_to(self, target):
+        """Returns the nodes to undo from the current one up to the
+        lowest common ancestor, and the ones to redo from there down to
+        target"""
+        up = []
+        down = []
+        node = self.current
+        while node.depth > target.depth:
+            up.append(node)
+            node = node.parent
+        while target.depth > node.depth:
+            down.append(target)
+            target = target.parent
+        while node is not target:
+            up.append(node)
+            down.append(target)
+            node = node.parent
+            target = target.parent
+        down.reverse()
+        return up, down
+
+    def ancestors(self, node=None):
+        node = node or self.current
+        while node is not None:
+            yield node
+            node = node.parent
+
+    def evict(self):
+        """Drops the oldest change, first the oldest leaf anywhere off the
+        path to the current node, so abandoned branches go one change at
+        a time, then the root. Returns False if only the current change
+        is left"""
+        on_path = set(map(id, self.ancestors()))
+        leaves = [node for node in self.nodes() if not node.children and id(node) not in on_path]
+        if leaves:
+            leaf = min(leaves, key=lambda node: node.serial)
+            parent = leaf.parent
+            parent.children.remove(leaf)
+            if parent.redo_child is leaf:
+                parent.redo_child = None
+            self.size -= 1
+            return True
+
+        root = self.root
+        if not root.children or root.children[0] is self.current:
+            return False
+        # The only child becomes the root, it can't be undone anymore
+        new_root = root.children[0]
+        new_root.parent = None
+        new_root.undo = Change("")
+        new_root.redo = None
+        stack = [new_root]
+        while stack:
+            node = stack.pop()
+            node.depth -= 1
+            stack.extend(node.children)
+        self.root = new_root
+        self.size -= 1
+        return True
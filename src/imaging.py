@@ -0,0 +1,316 @@
+# imaging.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import functools
+import itertools
+import math
+import operator
+from array import array
+
+# Wide range of ASCII characters from dark to light
+ASCII_RAMP = r"$@B%8&WM#*oahkbdpqwmZO0QLCJUYXzcvunxrjft/\|()1{}[]?-_+~<>i!lI;:,\"^`'."
+
+# Ramps the image importer can choose from, all from dark to light
+RAMPS = {
+    "detailed": ASCII_RAMP,
+    "simple": "@%#*+=-:. ",
+    "blocks": "\u2588\u2593\u2592\u2591 ",
+}
+
+# Rows added to a summed-area table between progress reports
+STRIP_HEIGHT = 16
+
+# Cells of the summed-area table of an imported image, larger images
+# are shrunk to it as their rows are added. It keeps the full detail
+# of the widest import the settings allow
+TABLE_MAX_PIXELS = 2048 * 2048
+
+# The brightness of every 8 bit channel value
+BRIGHTNESS = [value / 255.0 for value in range(256)]
+
+
+def brightness_to_ascii(brightness, ramp=ASCII_RAMP):
+    """Maps a brightness between 0.0, the darkest, and 1.0, the
+    brightest, to a character of the ramp"""
+    return ramp[int(brightness * (len(ramp) - 1))]
+
+
+@functools.lru_cache(maxsize=8)
+def ramp_table(ramp=ASCII_RAMP):
+    """Returns the character of the ramp for every 8 bit brightness
+    level as a 256 characters string usable with str.translate, the
+    same brightness_to_ascii gives for level / 255"""
+    return ''.join(brightness_to_ascii(brightness, ramp) for brightness in BRIGHTNESS)
+
+
+def levels_to_ascii(levels, width, ramp=ASCII_RAMP):
+    """Maps the 8 bit brightness levels of an image width pixels wide
+    to the characters of the ramp, one line per row"""
+    text = bytes(levels).decode('latin-1').translate(ramp_table(ramp))
+    return '\n'.join(text[start:start + width] for start in range(0, len(text), width))
+
+
+def iter_block_rows(pixels, width, height, channels, rowstride, block_size):
+    """Yields for every row of blocks the red, green and blue averages
+    of the block_size squares of the pixels. Blocks on the right and
+    bottom edges average the pixels they have.
+
+    Each color plane of a row is taken with one strided slice and the
+    blocks are summed column wise over whole rows instead of pixel by
+    pixel"""
+    blocks_x = -(-width // block_size)
+    padding = [0] * (blocks_x * block_size - width)
+    columns = [block_size] * (blocks_x - 1) + [width - (blocks_x - 1) * block_size]
+
+    for y in range(0, height, block_size):
+        rows = min(block_size, height - y)
+        counts = [count * rows for count in columns]
+        averages = []
+        for channel in range(3):
+            planes = [pixels[start:start + width * channels:channels]
+                      for start in range(y * rowstride + channel, (y + rows) * rowstride, rowstride)]
+            if block_size == 1:
+                averages.append(planes[0])
+                continue
+            totals = list(map(sum, zip(*planes))) + padding
+            totals = map(sum, zip(*[totals[offset::block_size] for offset in range(block_size)]))
+            averages.append(list(map(operator.floordiv, totals, counts)))
+        yield averages
+
+
+def downsample_pixbuf(pixels, width, height, channels, rowstride, block_size):
+    """Averages the colors of every block_size square of the pixels,
+    returns the averages, their brightness and the new size like
+    AsciiDrawWindow.downsample_pixbuf"""
+    downsampled_rgb = []
+    downsampled_brightness = []
+
+    for averages in iter_block_rows(pixels, width, height, channels, rowstride, block_size):
+        downsampled_rgb.extend(zip(*averages))
+        downsampled_brightness.extend(map(BRIGHTNESS.__getitem__, map(max, *averages)))
+
+    return downsampled_rgb, downsampled_brightness, width // block_size, height // block_size
+
+
+def downsample_levels(pixels, width, height, channels, rowstride, block_size, progress=None):
+    """Returns the brightness of every block as an 8 bit level, the
+    brightest channel of its average, with the number of blocks on a
+    row and the number of rows.
+
+    progress is called with the fraction done after every row of
+    blocks, when it returns False the downsampling stops and None is
+    returned"""
+    rows = -(-height // block_size)
+    levels = bytearray()
+    for row, averages in enumerate(iter_block_rows(pixels, width, height, channels, rowstride, block_size), 1):
+        levels.extend(map(max, *averages))
+        if progress is not None and progress(row / rows) is False:
+            return None
+    return levels, -(-width // block_size), rows
+
+
+def pixels_to_ascii(pixels, width, height, channels, rowstride, block_size, ramp=ASCII_RAMP, progress=None):
+    """Converts the pixels to text with one character of the ramp for
+    every block, None if progress stopped it"""
+    downsampled = downsample_levels(pixels, width, height, channels, rowstride, block_size, progress)
+    if downsampled is None:
+        return None
+    levels, columns, rows = downsampled
+    return levels_to_ascii(levels, columns, ramp)
+
+
+def rgb_to_hsb(r, g, b):
+    """Converts 8 bit red, green and blue to hue in degrees, saturation
+    and brightness between 0 and 1 like AsciiDrawWindow.rgb_to_hsb,
+    giving the same values. The channels are compared as integers and
+    turned to floats through the BRIGHTNESS table"""
+    rd = BRIGHTNESS[r]
+    gd = BRIGHTNESS[g]
+    bd = BRIGHTNESS[b]
+    if r >= g and r >= b:
+        delta = rd - (gd if g < b else bd)
+        if delta == 0:
+            return 0, 0 if r == 0 else 0.0, rd
+        return 60 * (((gd - bd) / delta) % 6), delta / rd, rd
+    if g >= b:
+        delta = gd - (rd if r < b else bd)
+        return 60 * (((bd - rd) / delta) + 2), delta / gd, gd
+    delta = bd - (rd if r < g else gd)
+    return 60 * (((rd - gd) / delta) + 4), delta / bd, bd
+
+
+def _hue(r, g, b):
+    if r >= g and r >= b:
+        delta = BRIGHTNESS[r] - (BRIGHTNESS[g] if g < b else BRIGHTNESS[b])
+        if delta == 0:
+            return 0
+        return 60 * (((BRIGHTNESS[g] - BRIGHTNESS[b]) / delta) % 6)
+    if g >= b:
+        delta = BRIGHTNESS[g] - (BRIGHTNESS[r] if r < b else BRIGHTNESS[b])
+        return 60 * (((BRIGHTNESS[b] - BRIGHTNESS[r]) / delta) + 2)
+    delta = BRIGHTNESS[b] - (BRIGHTNESS[r] if r < g else BRIGHTNESS[g])
+    return 60 * (((BRIGHTNESS[r] - BRIGHTNESS[g]) / delta) + 4)
+
+
+def _saturation(high, low):
+    if high == 0:
+        return 0
+    return (BRIGHTNESS[high] - BRIGHTNESS[low]) / BRIGHTNESS[high]
+
+
+def hsb_planes(reds, greens, blues):
+    """Converts planes of 8 bit red, green and blue values to planes of
+    hue, saturation and brightness as arrays of doubles holding the same
+    values rgb_to_hsb gives. The highest and lowest channels and the
+    brightness are found with map over whole planes, only the hue and
+    the saturation are computed per pixel"""
+    highs = bytes(map(max, reds, greens, blues))
+    lows = bytes(map(min, reds, greens, blues))
+    hues = array('d', map(_hue, reds, greens, blues))
+    saturations = array('d', map(_saturation, highs, lows))
+    values = array('d', map(BRIGHTNESS.__getitem__, highs))
+    return hues, saturations, values
+
+
+def pixbuf_planes(pixels, width, height, channels, rowstride):
+    """Returns the red, green and blue planes of the pixels without the
+    padding at the end of the rows"""
+    planes = (bytearray(), bytearray(), bytearray())
+    for y in range(height):
+        for channel, plane in enumerate(planes):
+            start = y * rowstride + channel
+            plane.extend(pixels[start:start + width * channels:channels])
+    return planes
+
+
+def pixbuf_to_hsb_planes(pixels, width, height, channels, rowstride):
+    """Converts the pixels to planes of hue, saturation and brightness"""
+    return hsb_planes(*pixbuf_planes(pixels, width, height, channels, rowstride))
+
+
+def table_size(width, height, max_pixels=TABLE_MAX_PIXELS):
+    """Returns the size of a table for an image of width by height with
+    the same aspect and at most max_pixels cells"""
+    if width * height <= max_pixels:
+        return width, height
+    scale = math.sqrt(max_pixels / (width * height))
+    return max(int(width * scale), 1), max(int(height * scale), 1)
+
+
+class IntegralImage():
+    """Summed-area table of the brightness levels of an image, the
+    brightest channel of every pixel. Any rectangle of it is averaged
+    with four lookups, so the image can be sampled again at any size
+    without going over its pixels. With max_pixels the table is smaller
+    than the image, every cell averages a block of it"""
+
+    def __init__(self, width, height, max_pixels=None):
+        self.source_width = width
+        self.source_height = height
+        if max_pixels is not None:
+            width, height = table_size(width, height, max_pixels)
+        self.width = width
+        self.height = height
+        self.typecode = 'I' if 255 * width * height < 2 ** 32 else 'Q'
+        # One row of width + 1 sums for every row added and a first row
+        # of zeros, the first column is zeros too
+        self.rows = [array(self.typecode, bytes(array(self.typecode).itemsize * (width + 1)))]
+
+        # Rows of the image added so far, the ones of the table row not
+        # finished yet are summed per column until its last one arrives
+        self.added = 0
+        self._edges = [x * self.source_width // width for x in range(width + 1)]
+        self._pick = operator.itemgetter(*self._edges)
+        self._sums = [0] * width
+
+    def __repr__(self):
+        return f"IntegralImage of {self.width}x{self.height} with {len(self.rows) - 1} rows"
+
+    @property
+    def complete(self):
+        return len(self.rows) == self.height + 1
+
+    def add_rows(self, pixels, count, channels, rowstride, offset=0):
+        """Adds the next count rows of the image, the first of them at
+        offset in pixels, so an image can be added in strips as it is
+        decoded. Only the column sums of one row of the table are kept
+        between strips"""
+        width = self.source_width
+        for start in range(offset, offset + count * rowstride, rowstride):
+            levels = map(max, *[pixels[start + channel:start + width * channels:channels] for channel in range(3)])
+            if self.width == width:
+                self._sums = list(map(operator.add, self._sums, levels))
+            else:
+                edges = self._pick(list(itertools.accumulate(levels, initial=0)))
+                self._sums = list(map(operator.add, self._sums, map(operator.sub, edges[1:], edges)))
+            self.added += 1
+
+            y = len(self.rows) - 1
+            if self.added < (y + 1) * self.source_height // self.height:
+                continue
+            height = self.added - y * self.source_height // self.height
+            areas = [(right - left) * height for left, right in zip(self._edges, self._edges[1:])]
+            levels = map(operator.floordiv, self._sums, areas)
+            self.rows.append(array(self.typecode, map(operator.add, self.rows[-1], itertools.accumulate(levels, initial=0))))
+            self._sums = [0] * self.width
+
+    @classmethod
+    def from_pixels(cls, pixels, width, height, channels, rowstride, progress=None, max_pixels=None):
+        """Builds the table one row at a time, progress works like in
+        downsample_levels"""
+        integral = cls(width, height, max_pixels)
+        for y in range(0, height, STRIP_HEIGHT):
+            count = min(STRIP_HEIGHT, height - y)
+            integral.add_rows(pixels, count, channels, rowstride, y * rowstride)
+            if progress is not None and progress((y + count) / height) is False:
+                return None
+        return integral
+
+    def memory_size(self):
+        return sum(row.itemsize * len(row) for row in self.rows)
+
+    def block_edges(self, columns, cell_aspect=1.0):
+        """Returns the left edges of columns blocks across the image and
+        the top edges of the rows of blocks that are cell_aspect times
+        as tall as they are wide, both ending with the far edge"""
+        columns = max(min(columns, self.width), 1)
+        rows = max(min(round(self.height * columns / (self.width * cell_aspect)), self.height), 1)
+        xs = [column * self.width // columns for column in range(columns + 1)]
+        ys = [row * self.height // rows for row in range(rows + 1)]
+        return xs, ys
+
+    def sample(self, columns, cell_aspect=1.0):
+        """Returns the average brightness level of every block as in
+        downsample_levels, for blocks laid out by block_edges"""
+        xs, ys = self.block_edges(columns, cell_aspect)
+        widths = [right - left for left, right in zip(xs, xs[1:])]
+        pick = operator.itemgetter(*xs)
+        levels = bytearray()
+        top = pick(self.rows[ys[0]])
+        for y0, y1 in zip(ys, ys[1:]):
+            bottom = pick(self.rows[y1])
+            sums = list(map(operator.sub, bottom, top))
+            areas = [width * (y1 - y0) for width in widths]
+            levels.extend(map(operator.floordiv, map(operator.sub, sums[1:], sums), areas))
+            top = bottom
+        return levels, len(xs) - 1, len(ys) - 1
+
+    def to_ascii(self, columns, cell_aspect=1.0, ramp=ASCII_RAMP):
+        levels, columns, rows = self.sample(columns, cell_aspect)
+        return levels_to_ascii(levels, columns, ramp)
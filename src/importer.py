@@ -0,0 +1,269 @@
+# importer.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from gi.repository import GdkPixbuf, GLib, GObject
+
+import math
+import os
+import queue
+import threading
+
+from . import imaging
+
+# Bytes of the file given to the loader at a time
+CHUNK_SIZE = 256 * 1024
+
+# Larger images are asked to be scaled down while they are decoded.
+# Loaders like the JPEG one decode at the smaller size, others like the
+# PNG and TIFF ones decode the full image and only scale it at the end,
+# the loader keeps the whole decoded image in memory either way
+MAX_PIXELS = 16 * 1024 * 1024
+
+
+class StripDecoder():
+    """Decodes an image with a PixbufLoader fed in chunks, the rows are
+    added to the summed-area table as soon as the loader has decoded
+    them. Pixels are copied out of the loader one strip at a time and
+    shrunk to the table right away, so apart from the image the loader
+    keeps only one strip is held at full resolution"""
+
+    def __init__(self, max_pixels=MAX_PIXELS):
+        self.max_pixels = max_pixels
+
+        self.loader = GdkPixbuf.PixbufLoader()
+        self.loader.connect("size-prepared", self.on_size_prepared)
+        self.loader.connect("area-updated", self.on_area_updated)
+
+        self.integral = None
+        self.closed = False
+        # Interlaced and progressive images update rows more than once,
+        # they are added from the finished image instead
+        self.in_order = True
+
+    def __repr__(self):
+        return f"StripDecoder with {self.integral}"
+
+    def on_size_prepared(self, loader, width, height):
+        if width * height > self.max_pixels:
+            scale = math.sqrt(self.max_pixels / (width * height))
+            loader.set_size(max(int(width * scale), 1), max(int(height * scale), 1))
+
+    def on_area_updated(self, loader, x, y, width, height):
+        if not self.in_order:
+            return
+        pixbuf = loader.get_pixbuf()
+        if self.integral is None:
+            self.integral = imaging.IntegralImage(pixbuf.get_width(), pixbuf.get_height(), imaging.TABLE_MAX_PIXELS)
+        done = self.integral.added
+        if x != 0 or width != pixbuf.get_width() or y > done or y + height <= done:
+            self.in_order = False
+            return
+        self.add_strip(pixbuf, done, y + height - done)
+
+    def add_strip(self, pixbuf, y, count):
+        # Loaders can report the whole image at once, it is still copied
+        # a strip at a time
+        for top in range(y, y + count, imaging.STRIP_HEIGHT):
+            height = min(imaging.STRIP_HEIGHT, y + count - top)
+            strip = pixbuf.new_subpixbuf(0, top, pixbuf.get_width(), height)
+            self.integral.add_rows(strip.get_pixels(), height, strip.get_n_channels(), strip.get_rowstride())
+
+    def write(self, data):
+        self.loader.write(data)
+
+    def close(self):
+        """Finishes decoding, returns the summed-area table or None if
+        nothing could be decoded"""
+        self.closed = True
+        self.loader.close()
+        pixbuf = self.loader.get_pixbuf()
+        if pixbuf is None:
+            return None
+        if self.integral is None or not self.in_order or not self.integral.complete:
+            self.integral = imaging.IntegralImage(pixbuf.get_width(), pixbuf.get_height(), imaging.TABLE_MAX_PIXELS)
+            self.add_strip(pixbuf, 0, pixbuf.get_height())
+        return self.integral
+
+    def abort(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.loader.close()
+        except GLib.Error:
+            pass
+
+
+class ImportJob():
+    """An image waiting to be converted or being converted"""
+
+    def __init__(self, path, columns, cell_aspect, ramp):
+        self.path = path
+        self.columns = columns
+        self.cell_aspect = cell_aspect
+        self.ramp = ramp
+
+        self.cancelled = threading.Event()
+        self.percent = -1
+
+        # Summed-area table of the image once converted, it stays with
+        # the job when later imports replace the one of the importer
+        self.integral = None
+
+    def __repr__(self):
+        return f"ImportJob of {self.path}"
+
+    def resample(self, columns, cell_aspect=1.0, ramp=imaging.ASCII_RAMP):
+        """Converts the image again at another size on the calling
+        thread, returns None if it wasn't converted"""
+        if self.integral is None:
+            return None
+        return self.integral.to_ascii(columns, cell_aspect, ramp)
+
+
+class ImageImporter(GObject.Object):
+    """Converts images to ASCII art on a thread, one after the other in
+    the order they were queued. Every signal is emitted on the main loop
+    so the handlers can touch the widgets and the canvas"""
+
+    __gsignals__ = {
+        'started': (GObject.SignalFlags.RUN_FIRST, None, (str,)),
+        'progress': (GObject.SignalFlags.RUN_FIRST, None, (str, float)),
+        'finished': (GObject.SignalFlags.RUN_FIRST, None, (str, str, object)),
+        'failed': (GObject.SignalFlags.RUN_FIRST, None, (str, str)),
+        'cancelled': (GObject.SignalFlags.RUN_FIRST, None, (str,)),
+    }
+
+    def __init__(self):
+        super().__init__()
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._jobs = []
+        self._lock = threading.Lock()
+        self.current = None
+
+        # Summed-area table of the last converted image, converting it
+        # again at another size only samples it, it is built again when
+        # the file changes
+        self.integral = None
+        self.integral_key = None
+
+    def __repr__(self):
+        return f"ImageImporter with {len(self._jobs)} queued images"
+
+    @property
+    def pending(self):
+        """The number of images queued or being converted"""
+        with self._lock:
+            return len(self._jobs)
+
+    def import_file(self, path, columns, cell_aspect=1.0, ramp=imaging.ASCII_RAMP):
+        """Queues the image at path to be converted to columns characters
+        wide, cell_aspect is the height of a character over its width.
+        The worker thread is started the first time an image is queued"""
+        job = ImportJob(path, columns, cell_aspect, ramp)
+        with self._lock:
+            self._jobs.append(job)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.__convert_images, daemon=True)
+            self._thread.start()
+        self._queue.put(job)
+        return job
+
+    def cancel(self, job=None):
+        """Cancels job, or the image being converted when not given, the
+        next queued image is converted after it"""
+        job = job or self.current
+        if job is not None:
+            job.cancelled.set()
+
+    def cancel_all(self):
+        with self._lock:
+            jobs = list(self._jobs)
+        for job in jobs:
+            job.cancelled.set()
+
+    def __emit(self, *args):
+        GLib.idle_add(self.emit, *args)
+
+    def __convert_images(self):
+        while True:
+            job = self._queue.get()
+            self.current = job
+            try:
+                self.__convert(job)
+            finally:
+                self.current = None
+                with self._lock:
+                    self._jobs.remove(job)
+
+    def __convert(self, job):
+        if job.cancelled.is_set():
+            self.__emit('cancelled', job.path)
+            return
+        self.__emit('started', job.path)
+
+        try:
+            key = (job.path, os.stat(job.path).st_mtime_ns)
+        except OSError as error:
+            self.__emit('failed', job.path, error.strerror)
+            return
+
+        if key != self.integral_key:
+            integral = self.__build_integral(job)
+            if integral is None:
+                return
+            self.integral = integral
+            self.integral_key = key
+
+        job.integral = self.integral
+        self.__emit('finished', job.path, job.resample(job.columns, job.cell_aspect, job.ramp), job)
+
+    def __build_integral(self, job):
+        # The previous table is dropped before building the next one
+        self.integral = None
+        self.integral_key = None
+
+        decoder = StripDecoder()
+        try:
+            size = max(os.path.getsize(job.path), 1)
+            with open(job.path, 'rb') as file:
+                while data := file.read(CHUNK_SIZE):
+                    if job.cancelled.is_set():
+                        decoder.abort()
+                        self.__emit('cancelled', job.path)
+                        return None
+                    decoder.write(data)
+                    # At most a hundred updates whatever the size of the image
+                    percent = file.tell() * 100 // size
+                    if percent != job.percent:
+                        job.percent = percent
+                        self.__emit('progress', job.path, file.tell() / size)
+            integral = decoder.close()
+            if integral is None:
+                self.__emit('failed', job.path, _("The image is empty"))
+            return integral
+        except OSError as error:
+            decoder.abort()
+            self.__emit('failed', job.path, error.strerror)
+        except GLib.Error as error:
+            decoder.abort()
+            self.__emit('failed', job.path, error.message)
+        return None
@@ -0,0 +1,138 @@
+# journal.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import os
+import queue
+import struct
+import threading
+import zlib
+
+# Kind, payload length and checksum of every record
+RECORD_HEADER = struct.Struct('<BII')
+
+# The whole drawing, every later record applies on top of the last one
+SNAPSHOT = 1
+# The cells of the drawing touched by a change, as they were after it
+CHANGE = 2
+
+# Width and height in front of the text of a snapshot
+SNAPSHOT_HEADER = struct.Struct('<II')
+
+
+def pack_snapshot(width, height, text):
+    return SNAPSHOT_HEADER.pack(width, height) + text.encode('utf-8')
+
+
+def unpack_snapshot(payload):
+    width, height = SNAPSHOT_HEADER.unpack_from(payload)
+    return width, height, payload[SNAPSHOT_HEADER.size:].decode('utf-8')
+
+
+def read_journal(path):
+    """Yields the kind and the payload of every complete record, a
+    record cut short by a crash ends the journal"""
+    with open(path, 'rb') as file:
+        data = file.read()
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(data):
+        kind, length, checksum = RECORD_HEADER.unpack_from(data, offset)
+        offset += RECORD_HEADER.size
+        compressed = data[offset:offset + length]
+        if len(compressed) < length or zlib.crc32(compressed) != checksum:
+            return
+        offset += length
+        yield kind, zlib.decompress(compressed)
+
+
+class Journal():
+    """An append only file of compressed records written by a thread,
+    records are queued from the main loop and synced to disk in batches
+    so drawing never waits for the disk"""
+
+    def __init__(self, path):
+        self.path = path
+
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def __repr__(self):
+        return f"Journal at {self.path}"
+
+    def open(self):
+        """Truncates the journal and starts the writer thread"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        file = open(self.path, 'wb')
+        self._thread = threading.Thread(target=self.__write_records, args=(file,), daemon=True)
+        self._thread.start()
+
+    def append(self, kind, payload):
+        """Queues a record, payload is bytes or a function returning
+        them that is called on the writer thread"""
+        if self._thread is None:
+            return
+        self._queue.put((kind, payload))
+
+    def flush(self):
+        """Waits until the queued records are on disk"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self, remove=False):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        if remove and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __write_records(self, file):
+        with file:
+            while True:
+                batch = [self._queue.get()]
+                # Everything queued meanwhile goes in the same sync
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                closing = False
+                try:
+                    for record in batch:
+                        if record is None:
+                            closing = True
+                            continue
+                        kind, payload = record
+                        if callable(payload):
+                            payload = payload()
+                        compressed = zlib.compress(payload, 1)
+                        file.write(RECORD_HEADER.pack(kind, len(compressed), zlib.crc32(compressed)))
+                        file.write(compressed)
+                    file.flush()
+                    os.fsync(file.fileno())
+                except OSError:
+                    print(f"Error writing to {self.path}.")
+
+                for record in batch:
+                    self._queue.task_done()
+                if closing:
+                    return
@@ -133,6 +133,14 @@ class AsciiDrawApplication(Adw.Application):
 
         self.win.present()
 
+    def do_shutdown(self):
+        # The journal is only needed while there are unsaved changes
+        win = getattr(self, 'win', None)
+        if win:
+            win.importer.cancel_all()
+            win.canvas.stop_journal(remove=win.canvas.is_saved)
+        Adw.Application.do_shutdown(self)
+
     def on_about_action(self, *args):
         """Callback for the app.about action."""
         about = Adw.AboutDialog(
@@ -218,6 +226,7 @@ class AsciiDrawApplication(Adw.Application):
         if response == "save":
             self.win.save(self.quit)
         elif response == "discard":
+            self.win.canvas.stop_journal(remove=True)
             self.quit()
 
     def on_save_changes(self, dialog, task, *args):
@@ -225,6 +234,7 @@ class AsciiDrawApplication(Adw.Application):
         if response == "save":
             self.win.save()
         elif response == "discard":
+            self.win.canvas.stop_journal(remove=True)
             self.quit()
 
     def select_rectangle_tool(self, *args):
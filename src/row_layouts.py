@@ -0,0 +1,96 @@
+# row_layouts.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from gi.repository import Pango, PangoCairo
+
+import re
+
+RUN_PATTERN = re.compile(r'[^ ]+')
+
+
+class RowLayouts():
+    """Draws whole rows as runs of non blank characters, one Pango layout
+    per run, keeping the layouts of every row until its text changes"""
+
+    def __init__(self, cell_width, cell_height):
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+
+        self.context = PangoCairo.FontMap.get_default().create_context()
+        self.font_size = 0
+        self.font = None
+        self.attributes = None
+        self.baseline = 0
+
+        self.rows = {}
+
+    def __repr__(self):
+        return f"RowLayouts caching {len(self.rows)} rows"
+
+    def configure(self, font_size, cell_height=None):
+        if cell_height is not None:
+            self.cell_height = cell_height
+        if font_size == self.font_size:
+            return
+
+        self.font_size = font_size
+        self.font = Pango.FontDescription.from_string("monospace")
+        self.font.set_absolute_size(font_size * Pango.SCALE)
+
+        # Stretch or squeeze the advance so that every character of a
+        # run lands on its own cell
+        layout = Pango.Layout.new(self.context)
+        layout.set_font_description(self.font)
+        layout.set_text("M", -1)
+        advance = layout.get_size()[0]
+        self.attributes = Pango.AttrList()
+        self.attributes.insert(Pango.attr_letter_spacing_new(self.cell_width * Pango.SCALE - advance))
+        self.baseline = layout.get_baseline() / Pango.SCALE
+
+        self.invalidate()
+
+    def invalidate(self):
+        self.rows = {}
+
+    def forget_rows_after(self, height):
+        for y in [y for y in self.rows if y >= height]:
+            del self.rows[y]
+
+    def get_runs(self, y, text):
+        cached = self.rows.get(y)
+        if cached is not None and cached[0] == text:
+            return cached[1]
+
+        runs = []
+        for match in RUN_PATTERN.finditer(text):
+            layout = Pango.Layout.new(self.context)
+            layout.set_font_description(self.font)
+            layout.set_attributes(self.attributes)
+            layout.set_text(match.group(), -1)
+            runs.append((match.start(), layout))
+        self.rows[y] = (text, runs)
+        return runs
+
+    def draw_row(self, cr, y, text, color):
+        """Draws the full text of row y, cr must already be cleared"""
+        cr.set_source_rgb(color, color, color)
+        baseline = (y + 1) * self.cell_height - 5
+        for x, layout in self.get_runs(y, text):
+            cr.move_to(x * self.cell_width, baseline - self.baseline)
+            PangoCairo.show_layout(cr, layout)
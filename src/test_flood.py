@@ -0,0 +1,148 @@
+import unittest
+from grid import Grid, TiledGrid
+from flood import span_fill, spans_mask, match_spans, ComponentIndex, pattern_texts, gradient_texts
+
+class TestSpanFill(unittest.TestCase):
+    """
+    Unit tests for the scanline span fill.
+    """
+
+    def test_fill_stops_at_borders(self):
+        """
+        Only the cells connected to the start are filled.
+        """
+        grid = Grid.from_lines([
+            "  #  ",
+            " # # ",
+            "  #  ",
+        ], 5, 3)
+        self.assertEqual(span_fill(grid, 2, 1), [(1, 2, 3)])
+        outside = span_fill(grid, 0, 0)
+        self.assertIn((0, 0, 2), outside)
+        self.assertNotIn((1, 2, 3), outside)
+
+    def test_fill_follows_u_turns(self):
+        """
+        Areas reached by going back up are filled too.
+        """
+        grid = Grid.from_lines([
+            " # ",
+            " # ",
+            "   ",
+        ], 3, 3)
+        self.assertEqual(span_fill(grid, 0, 0), [(0, 0, 1), (0, 2, 3), (1, 0, 1), (1, 2, 3), (2, 0, 3)])
+
+    def test_mask(self):
+        """
+        The mask covers the spans inside their bounding box.
+        """
+        self.assertEqual(spans_mask([(1, 1, 3), (2, 2, 3)]), (1, 1, 2, 2, bytes([1, 1, 0, 1])))
+
+    def test_large_open_area(self):
+        """
+        A 500x200 open area is filled with one span per row, reading
+        every row once.
+        """
+        grid = TiledGrid(500, 200)
+        rows_read = []
+        get_row = grid.get_row
+        grid.get_row = lambda y, *args: rows_read.append(y) or get_row(y, *args)
+        spans = span_fill(grid, 250, 100)
+        self.assertEqual(spans, [(y, 0, 500) for y in range(200)])
+        self.assertEqual(sorted(rows_read), list(range(200)))
+
+class TestMatchSpans(unittest.TestCase):
+    """
+    Unit tests for finding every run of a character.
+    """
+
+    def test_whole_layer(self):
+        """
+        Runs are found on every row, connected or not.
+        """
+        grid = Grid.from_lines(["##.#", "..##"], 4, 2)
+        self.assertEqual(match_spans(grid, "#"), [(0, 0, 2), (0, 3, 4), (1, 2, 4)])
+
+    def test_rectangle(self):
+        """
+        Runs are clipped to the rectangle.
+        """
+        grid = Grid.from_lines(["####", "####"], 4, 2)
+        self.assertEqual(match_spans(grid, "#", 1, 1, 2, 5), [(1, 1, 3)])
+
+class TestFillTexts(unittest.TestCase):
+    """
+    Unit tests for the texts of pattern and gradient fills.
+    """
+
+    def test_pattern_is_anchored_to_the_layer(self):
+        """
+        Pattern tiles line up across spans wherever they start.
+        """
+        spans = [(0, 1, 5), (1, 0, 3), (2, 2, 4)]
+        self.assertEqual(pattern_texts(spans, ["ab", "c"]), ["baba", "c c", "ab"])
+
+    def test_horizontal_gradient(self):
+        """
+        The ramp goes from the left to the right of all the spans.
+        """
+        self.assertEqual(gradient_texts([(0, 0, 3), (1, 1, 3)], "abc"), ["abc", "bc"])
+
+    def test_vertical_gradient(self):
+        """
+        Every row gets one character of the ramp.
+        """
+        self.assertEqual(gradient_texts([(4, 0, 2), (5, 1, 2), (6, 0, 1)], "abc", True), ["aa", "b", "c"])
+
+class TestComponentIndex(unittest.TestCase):
+    """
+    Unit tests for the labeled connected areas.
+    """
+
+    def test_labels_match_span_fill(self):
+        """
+        Every cell belongs to the same area the span fill reaches.
+        """
+        grid = Grid.from_lines([
+            "a#b#",
+            "a##b",
+            "aab ",
+        ], 4, 3)
+        index = ComponentIndex(grid)
+        for y in range(3):
+            for x in range(4):
+                component = index.component_at(x, y)
+                self.assertEqual(component.spans, span_fill(grid, x, y))
+                self.assertEqual(component.char, grid.get_char_at(x, y))
+        self.assertIsNone(index.component_at(4, 0))
+
+    def test_statistics(self):
+        """
+        Size and bounds are measured over the spans.
+        """
+        grid = Grid.from_lines([
+            " ## ",
+            "  ##",
+        ], 4, 2)
+        component = ComponentIndex(grid).component_at(1, 0)
+        self.assertEqual(component.size, 4)
+        self.assertEqual(component.bounds, (1, 0, 3, 2))
+
+    def test_invalidate_relabels(self):
+        """
+        Areas next to a change are labeled again, others are kept.
+        """
+        grid = Grid.from_lines([
+            "a a    b",
+            "       b",
+        ], 8, 2)
+        index = ComponentIndex(grid)
+        far = index.component_at(7, 0)
+        self.assertEqual(index.component_at(0, 0).size, 1)
+        grid.set_char_at(1, 0, "a")
+        index.invalidate(1, 0)
+        self.assertEqual(index.component_at(0, 0).size, 3)
+        self.assertIs(index.component_at(7, 1), far)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import unittest
+from grid import Grid, TiledGrid, Overlay, TILE_WIDTH, TILE_HEIGHT
+
+class TestGrid(unittest.TestCase):
+    """
+    Unit tests for the Grid cell buffer used by the canvas.
+    """
+
+    def test_get_and_set_char(self):
+        """
+        Cells can be written and read back, out of bounds access is ignored.
+        """
+        grid = Grid(4, 3)
+        self.assertTrue(grid.set_char_at(1, 2, '#'))
+        self.assertEqual(grid.get_char_at(1, 2), '#')
+        self.assertFalse(grid.set_char_at(4, 0, '#'))
+        self.assertIsNone(grid.get_char_at(-1, 0))
+
+    def test_region(self):
+        """
+        Regions are padded with blanks where they leave the grid.
+        """
+        grid = Grid.from_lines(["ab", "cd"], 3, 2)
+        self.assertEqual(grid.get_region(-1, 0, 3, 3), [" ab", " cd", "   "])
+
+    def test_transparent_region(self):
+        """
+        Transparent writes leave the cells under blanks untouched.
+        """
+        grid = Grid.from_lines(["xxxx"], 4, 1)
+        grid.set_region(0, 0, ["a  b"], True)
+        self.assertEqual(grid.get_row(0), "axxb")
+
+    def test_resize(self):
+        """
+        Resizing keeps the top left content and blanks the new cells.
+        """
+        grid = Grid.from_lines(["abc", "def"], 3, 2)
+        grid.resize(2, 3)
+        self.assertEqual(grid.get_text(), "ab\nde\n  \n")
+
+class TestTiledGrid(unittest.TestCase):
+    """
+    Unit tests for the sparse TiledGrid used by the drawing layer.
+    """
+
+    def test_blank_writes_do_not_allocate(self):
+        """
+        Writing blanks into untouched tiles keeps them shared.
+        """
+        grid = TiledGrid(1000, 500)
+        grid.set_row(10, " " * 1000)
+        grid.set_char_at(999, 499, " ")
+        self.assertEqual(list(grid.iter_tiles()), [])
+
+    def test_rows_across_tiles(self):
+        """
+        Rows written across tile borders read back like a dense grid.
+        """
+        text = "ab" * TILE_WIDTH
+        grid = TiledGrid(TILE_WIDTH * 3, 2)
+        dense = Grid(TILE_WIDTH * 3, 2)
+        for layer in (grid, dense):
+            layer.set_row(1, text, TILE_WIDTH // 2)
+            layer.set_char_at(0, 0, "#")
+        self.assertEqual(grid.get_text(), dense.get_text())
+        self.assertEqual(len(list(grid.iter_tiles())), 3)
+
+    def test_text_with_blank_tiles(self):
+        """
+        The text around and between scattered tiles matches a dense grid.
+        """
+        width, height = TILE_WIDTH * 3 - 5, TILE_HEIGHT * 4 - 3
+        grid = TiledGrid(width, height)
+        dense = Grid(width, height)
+        for layer in (grid, dense):
+            layer.set_char_at(TILE_WIDTH * 2 + 1, TILE_HEIGHT + 2, "x")
+            layer.set_char_at(3, TILE_HEIGHT + 5, "y")
+            layer.set_char_at(width - 1, height - 1, "z")
+        self.assertEqual(grid.get_text(), dense.get_text())
+
+    def test_resize_drops_tiles(self):
+        """
+        Shrinking drops the tiles outside and blanks the cut off cells.
+        """
+        grid = TiledGrid(TILE_WIDTH * 2, 4)
+        grid.set_row(0, "x" * TILE_WIDTH * 2)
+        grid.resize(3, 4)
+        grid.resize(TILE_WIDTH * 2, 4)
+        self.assertEqual(grid.get_row(0).rstrip(), "xxx")
+        self.assertEqual(len(list(grid.iter_tiles())), 1)
+
+    def test_iter_rows_skips_blank_bands(self):
+        """
+        Only the rows of bands holding tiles are yielded.
+        """
+        grid = TiledGrid(TILE_WIDTH * 2, TILE_HEIGHT * 3)
+        grid.set_char_at(TILE_WIDTH, TILE_HEIGHT + 1, "#")
+        rows = dict(grid.iter_rows())
+        self.assertEqual(sorted(rows), list(range(TILE_HEIGHT, TILE_HEIGHT * 2)))
+        self.assertEqual(rows[TILE_HEIGHT + 1].strip(), "#")
+        clipped = [y for y, line in grid.iter_rows(TILE_HEIGHT + 1, TILE_HEIGHT + 3)]
+        self.assertEqual(clipped, [TILE_HEIGHT + 1, TILE_HEIGHT + 2])
+
+    def test_copies_share_tiles_until_written(self):
+        """
+        Writing in a copy or its source leaves the other unchanged.
+        """
+        grid = TiledGrid(TILE_WIDTH * 2, 4)
+        grid.set_row(0, "a" * TILE_WIDTH * 2)
+        copy = grid.copy()
+        copy.set_char_at(0, 0, "b")
+        grid.set_char_at(TILE_WIDTH, 0, "c")
+        copy.resize(3, 4)
+        self.assertEqual(grid.get_row(0, 0, 2), "aa")
+        self.assertEqual(copy.get_row(0), "baa")
+        self.assertEqual(grid.get_row(0, TILE_WIDTH - 1, TILE_WIDTH + 1), "ac")
+
+class TestOverlay(unittest.TestCase):
+    """
+    Unit tests for the sparse Overlay used by the preview layer.
+    """
+
+    def test_only_touched_cells_are_kept(self):
+        """
+        Blanks are not stored and clearing forgets every cell.
+        """
+        overlay = Overlay(2000, 1000)
+        overlay.set_row(3, "a b", 10)
+        self.assertEqual(sorted(overlay.iter_cells()), [(10, 3, "a"), (12, 3, "b")])
+        self.assertEqual(overlay.get_region(9, 3, 5, 1), [" a b "])
+        overlay.fill()
+        self.assertEqual(len(overlay), 0)
+
+    def test_resize_drops_cells_outside(self):
+        """
+        Shrinking forgets the cells that fall outside.
+        """
+        overlay = Overlay(10, 10)
+        overlay.set_char_at(1, 1, "x")
+        overlay.set_char_at(8, 8, "y")
+        overlay.resize(5, 5)
+        self.assertEqual(list(overlay.iter_cells()), [(1, 1, "x")])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+import unittest
+from grid import Grid, TiledGrid
+from history import Change, History, RegionSnapshot, Stroke, pack_position, unpack_position
+
+class TestChange(unittest.TestCase):
+    """
+    Unit tests for the Change undo record.
+    """
+
+    def test_first_write_wins(self):
+        """
+        Only the first character recorded for a cell is kept.
+        """
+        change = Change("Freehand")
+        change.add_change(3, 4, "a")
+        change.add_change(3, 4, "b")
+        change.add_change(4, 3, "c")
+        self.assertEqual(list(change.changes), [(3, 4, "a"), (4, 3, "c")])
+        self.assertEqual(len(change), 2)
+
+    def test_pack_position(self):
+        """
+        Packed positions unpack to the same cell.
+        """
+        self.assertEqual(unpack_position(pack_position(2047, 1023)), (2047, 1023))
+
+    def test_memory_size_grows(self):
+        """
+        The reported size grows with the recorded cells.
+        """
+        change = Change("Fill")
+        empty = change.memory_size()
+        for x in range(100):
+            change.add_change(x, 0, " ")
+        self.assertGreater(change.memory_size(), empty)
+
+    def test_pack_round_trip(self):
+        """
+        Packing and unpacking keeps the cells and the regions.
+        """
+        grid = Grid.from_lines(["ab", "cd"], 2, 2)
+        change = Change("Fill")
+        change.add_change(5, 6, "z")
+        change.add_region(RegionSnapshot.capture(grid, 0, 0, 2, 2, bytes([1, 0, 0, 1])))
+        change.pack()
+        self.assertEqual(list(change.changes), [])
+        change.unpack()
+        self.assertEqual(list(change.changes), [(5, 6, "z")])
+        region = change.regions[0]
+        self.assertEqual((region.cells, region.mask), ("abcd", bytes([1, 0, 0, 1])))
+        self.assertEqual(Change.from_bytes(change.to_bytes()).name, "Fill")
+
+    def test_region_after_pack(self):
+        """
+        A region recorded into a packed change is kept with the packed
+        cells and regions.
+        """
+        grid = Grid.from_lines(["ab", "cd"], 2, 2)
+        change = Change("Freehand")
+        change.add_change(0, 0, "x")
+        change.pack()
+        change.add_region(RegionSnapshot.capture(grid, 0, 1, 2, 1))
+        change.pack()
+        change.unpack()
+        self.assertEqual(list(change.changes), [(0, 0, "x")])
+        self.assertEqual([region.cells for region in change.regions], ["cd"])
+
+    def test_grid_replaces_the_cells(self):
+        """
+        A change keeping the whole grid drops its cells and is not packed.
+        """
+        change = Change("Resize")
+        change.add_change(0, 0, "a")
+        change.set_grid(TiledGrid(10, 10))
+        change.add_change(1, 1, "b")
+        change.pack()
+        self.assertEqual(list(change.changes), [])
+        self.assertIsNone(change.packed)
+
+class TestStroke(unittest.TestCase):
+    """
+    Unit tests for the Stroke buffer.
+    """
+
+    def test_merge_keeps_first_write(self):
+        """
+        Cells buffered twice keep their first character when merged.
+        """
+        stroke = Stroke()
+        stroke.record(1, 1, "a")
+        stroke.record(2, 1, "b")
+        stroke.record(1, 1, "#")
+        change = Change("Freehand")
+        stroke.merge_into(change)
+        self.assertEqual(list(change.changes), [(1, 1, "a"), (2, 1, "b")])
+        self.assertEqual(len(stroke), 3)
+
+class TestRegionSnapshot(unittest.TestCase):
+    """
+    Unit tests for the RegionSnapshot undo record.
+    """
+
+    def test_restore(self):
+        """
+        A captured region is written back as it was.
+        """
+        grid = Grid.from_lines(["abcd", "efgh"], 4, 2)
+        snapshot = RegionSnapshot.capture(grid, 1, 0, 2, 2)
+        grid.fill()
+        snapshot.restore(grid)
+        self.assertEqual(grid.get_text(), " bc \n fg \n")
+
+    def test_masked_restore(self):
+        """
+        Only the masked cells are restored.
+        """
+        grid = Grid.from_lines(["abc"], 3, 1)
+        snapshot = RegionSnapshot.capture(grid, 0, 0, 3, 1, bytes([1, 0, 1]))
+        grid.fill("x")
+        snapshot.restore(grid)
+        self.assertEqual(grid.get_row(0), "axc")
+        self.assertEqual(len(snapshot), 2)
+
+    def test_cells_covered_by_a_region_are_skipped(self):
+        """
+        Cells already recorded by a region are not recorded again.
+        """
+        grid = Grid(4, 4)
+        change = Change("Clear")
+        change.add_region(RegionSnapshot.capture(grid, 0, 0, 2, 2))
+        change.add_change(1, 1, "x")
+        change.add_change(3, 3, "y")
+        self.assertEqual(list(change.changes), [(3, 3, "y")])
+
+class TestHistory(unittest.TestCase):
+    """
+    Unit tests for the History undo tree.
+    """
+
+    def test_path_goes_through_the_common_ancestor(self):
+        """
+        Jumping between branches only undoes and redoes the nodes below
+        their lowest common ancestor.
+        """
+        history = History()
+        base = history.add(Change("Base"))
+        first = history.add(Change("First"))
+        history.current = base
+        second = history.add(Change("Second"))
+        third = history.add(Change("Third"))
+        up, down = history.path_to(first)
+        self.assertEqual(up, [third, second])
+        self.assertEqual(down, [first])
+        self.assertIs(base.redo_child, second)
+
+    def test_evict_drops_old_branches_then_the_root(self):
+        """
+        Eviction removes the branches off the current path first and
+        never the current change.
+        """
+        history = History()
+        base = history.add(Change("Base"))
+        history.current = history.root
+        history.add(Change("Other"))
+        history.current = base
+        top = history.add(Change("Top"))
+        self.assertTrue(history.evict())
+        self.assertEqual(len(history), 2)
+        self.assertTrue(history.evict())
+        self.assertIs(history.root, base)
+        self.assertEqual(top.depth, 1)
+        self.assertFalse(history.evict())
+
+    def test_evict_deep_branch_before_the_current_path(self):
+        """
+        A branch off a later step goes before any step on the current
+        path, one change at a time.
+        """
+        history = History()
+        steps = [history.add(Change(f"Step {index}")) for index in range(10)]
+        history.current = steps[4]
+        for index in range(5):
+            history.add(Change(f"Branch {index}"))
+        history.current = steps[-1]
+        while len(history) > 8:
+            self.assertTrue(history.evict())
+        self.assertEqual(len(history), 8)
+        self.assertEqual(len(list(history.ancestors())) - 1, 8)
+        self.assertIs(history.root, steps[1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import unittest
+import imaging
+
+class TestImaging(unittest.TestCase):
+    """
+    Unit tests for the gi-free image conversion helpers.
+    """
+
+    def test_brightness_to_ascii(self):
+        """
+        The ends of the ramp map to its first and last characters.
+        """
+        self.assertEqual(imaging.brightness_to_ascii(0.0), '$')
+        self.assertEqual(imaging.brightness_to_ascii(1.0), '.')
+        self.assertEqual(imaging.brightness_to_ascii(0.5, "abc"), 'b')
+
+    def test_downsample_ragged_blocks(self):
+        """
+        Blocks on the edges average only the pixels they cover and the
+        padding at the end of the rows is skipped.
+        """
+        pixels = []
+        for y in range(3):
+            for x in range(3):
+                pixels += [10 * (y * 3 + x) + 5, 200, 3 * x]
+            pixels.append(99)
+        rgb, brightness, new_width, new_height = imaging.downsample_pixbuf(pixels, 3, 3, 3, 10, 2)
+        self.assertEqual(rgb, [(25, 200, 1), (40, 200, 6), (70, 200, 1), (85, 200, 6)])
+        self.assertEqual(brightness, [200 / 255.0] * 4)
+        self.assertEqual((new_width, new_height), (1, 1))
+
+    def test_downsample_bytes(self):
+        """
+        Pixel bytes with an alpha channel give the same result as a list.
+        """
+        pixels = bytes([255, 0, 0, 9, 0, 255, 0, 9, 0, 0, 255, 9, 255, 255, 255, 9])
+        self.assertEqual(
+            imaging.downsample_pixbuf(pixels, 2, 2, 4, 8, 1),
+            imaging.downsample_pixbuf(list(pixels), 2, 2, 4, 8, 1))
+        rgb, brightness, new_width, new_height = imaging.downsample_pixbuf(pixels, 2, 2, 4, 8, 2)
+        self.assertEqual(rgb, [(127, 127, 127)])
+
+    def test_ramp_table(self):
+        """
+        The table gives the character brightness_to_ascii gives for
+        every level.
+        """
+        for ramp in imaging.RAMPS.values():
+            table = imaging.ramp_table(ramp)
+            self.assertEqual(len(table), 256)
+            for level in range(256):
+                self.assertEqual(table[level], imaging.brightness_to_ascii(level / 255.0, ramp))
+
+    def test_pixels_to_ascii(self):
+        """
+        Rows of blocks become lines of the chosen ramp.
+        """
+        pixels = bytes([0, 0, 0, 255, 255, 255, 0, 0, 0, 255, 255, 255])
+        self.assertEqual(imaging.pixels_to_ascii(pixels, 2, 2, 3, 6, 1), "$.\n$.")
+        self.assertEqual(imaging.pixels_to_ascii(pixels, 2, 2, 3, 6, 2, "ab"), "a")
+
+    def test_progress_can_stop(self):
+        """
+        Progress is reported after every row of blocks and returning
+        False stops the conversion.
+        """
+        pixels = bytes(3 * 4 * 4)
+        fractions = []
+        self.assertEqual(imaging.pixels_to_ascii(pixels, 4, 4, 3, 12, 2, progress=fractions.append), "$$\n$$")
+        self.assertEqual(fractions, [0.5, 1.0])
+        self.assertIsNone(imaging.pixels_to_ascii(pixels, 4, 4, 3, 12, 2, progress=lambda fraction: False))
+
+    def test_integral_blocks(self):
+        """
+        Blocks sampled from the summed-area table average the brightest
+        channel of their pixels like downsample_levels does.
+        """
+        pixels = bytes(value * 37 % 256 for value in range(4 * 6 * 3))
+        integral = imaging.IntegralImage.from_pixels(pixels, 4, 6, 3, 12)
+        levels, columns, rows = integral.sample(2)
+        self.assertEqual((columns, rows), (2, 3))
+        expected, _, _ = imaging.downsample_levels(
+            bytes(max(pixels[i:i + 3]) for i in range(0, len(pixels), 3) for channel in range(3)), 4, 6, 3, 12, 2)
+        self.assertEqual(levels, expected)
+
+    def test_integral_in_strips(self):
+        """
+        Adding an image in strips of any height gives the same table as
+        adding it at once.
+        """
+        pixels = bytes(value * 53 % 256 for value in range(5 * 7 * 4))
+        whole = imaging.IntegralImage.from_pixels(pixels, 5, 7, 4, 20)
+        strips = imaging.IntegralImage(5, 7)
+        for y, count in ((0, 3), (3, 1), (4, 3)):
+            self.assertFalse(strips.complete)
+            strips.add_rows(pixels[y * 20:], count, 4, 20)
+        self.assertTrue(strips.complete)
+        self.assertEqual(strips.rows, whole.rows)
+
+    def test_integral_shrunk_in_strips(self):
+        """
+        A table smaller than the image holds the averages of its blocks
+        and only keeps the column sums of one table row between strips.
+        """
+        pixels = bytes(value * 29 % 256 for value in range(8 * 6 * 3))
+        integral = imaging.IntegralImage(8, 6, max_pixels=12)
+        self.assertEqual((integral.width, integral.height), (4, 3))
+        for y, count in ((0, 1), (1, 4), (5, 1)):
+            integral.add_rows(pixels[y * 24:], count, 3, 24)
+            self.assertEqual(len(integral._sums), 4)
+        self.assertTrue(integral.complete)
+        levels, columns, rows = integral.sample(4)
+        self.assertEqual((columns, rows), (4, 3))
+        expected, _, _ = imaging.downsample_levels(
+            bytes(max(pixels[i:i + 3]) for i in range(0, len(pixels), 3) for channel in range(3)), 8, 6, 3, 24, 2)
+        self.assertEqual(levels, expected)
+        whole = imaging.IntegralImage.from_pixels(pixels, 8, 6, 3, 24, max_pixels=12)
+        self.assertEqual(whole.rows, integral.rows)
+
+    def test_integral_cell_aspect(self):
+        """
+        Blocks are cell_aspect times as tall as they are wide and every
+        pixel falls in exactly one block.
+        """
+        integral = imaging.IntegralImage.from_pixels(bytes(100 * 90 * 3), 100, 90, 3, 300)
+        xs, ys = integral.block_edges(10, 2.0)
+        self.assertEqual(xs, list(range(0, 101, 10)))
+        self.assertEqual(ys, [0, 22, 45, 67, 90])
+        self.assertEqual(integral.to_ascii(3, 2.0, "ab"), "aaa")
+
+    def test_rgb_to_hsb(self):
+        """
+        Primary colors, gray and black convert to their known values.
+        """
+        self.assertEqual(imaging.rgb_to_hsb(255, 0, 0), (0.0, 1.0, 1.0))
+        self.assertEqual(imaging.rgb_to_hsb(0, 255, 0), (120.0, 1.0, 1.0))
+        self.assertEqual(imaging.rgb_to_hsb(0, 0, 255), (240.0, 1.0, 1.0))
+        self.assertEqual(imaging.rgb_to_hsb(51, 51, 51), (0, 0.0, 0.2))
+        self.assertEqual(imaging.rgb_to_hsb(0, 0, 0), (0, 0, 0.0))
+
+    def test_hsb_planes(self):
+        """
+        The planes hold exactly the values of the scalar conversion and
+        the padding of the rows is skipped.
+        """
+        pixels = bytes([255, 128, 0, 7, 10, 200, 90, 7, 0, 0, 0, 7, 33, 33, 40, 7])
+        hues, saturations, values = imaging.pixbuf_to_hsb_planes(pixels, 1, 4, 3, 4)
+        expected = [imaging.rgb_to_hsb(*pixels[start:start + 3]) for start in range(0, 16, 4)]
+        self.assertEqual(list(zip(hues, saturations, values)), expected)
+
+if __name__ == '__main__':
+    unittest.main()
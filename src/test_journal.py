@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+from journal import Journal, read_journal, pack_snapshot, unpack_snapshot, SNAPSHOT, CHANGE
+
+class TestJournal(unittest.TestCase):
+    """
+    Unit tests for the append only Journal.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "drawing.journal")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_records_read_back_in_order(self):
+        """
+        Appended records are read back in order, lazy payloads included.
+        """
+        journal = Journal(self.path)
+        journal.open()
+        journal.append(SNAPSHOT, pack_snapshot(3, 1, "abc\n"))
+        journal.append(CHANGE, lambda: b"cells")
+        journal.close()
+        records = list(read_journal(self.path))
+        self.assertEqual(records[1], (CHANGE, b"cells"))
+        self.assertEqual(unpack_snapshot(records[0][1]), (3, 1, "abc\n"))
+
+    def test_torn_record_ends_the_journal(self):
+        """
+        A record cut short by a crash is ignored with everything after it.
+        """
+        journal = Journal(self.path)
+        journal.open()
+        journal.append(CHANGE, b"first")
+        journal.append(CHANGE, b"second")
+        journal.close()
+        with open(self.path, 'r+b') as file:
+            file.truncate(os.path.getsize(self.path) - 1)
+        self.assertEqual(list(read_journal(self.path)), [(CHANGE, b"first")])
+
+    def test_close_can_remove(self):
+        """
+        Closing with remove deletes the journal file.
+        """
+        journal = Journal(self.path)
+        journal.open()
+        journal.flush()
+        journal.close(remove=True)
+        self.assertFalse(os.path.exists(self.path))
+
+if __name__ == '__main__':
+    unittest.main()
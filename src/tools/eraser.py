@@ -66,7 +66,7 @@ class Eraser(Tool):
         self.start_x = start_x
         self.start_y = start_y
 
-        self.canvas.add_undo_action(_("Eraser"))
+        self.canvas.begin_stroke(_("Eraser"))
 
     def on_drag_follow(self, gesture, end_x, end_y):
         if not self._active: return
@@ -88,7 +88,7 @@ class Eraser(Tool):
 
     def on_drag_end(self, gesture, delta_x, delta_y):
         if not self._active: return
-        pass
+        self.canvas.end_stroke()
 
     def on_click_pressed(self, click, arg, x, y):
         if not self._active: return
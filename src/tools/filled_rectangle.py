@@ -123,6 +123,8 @@ class FilledRectangle(GObject.GObject):
             start_y_char -= height
         height += 1
 
+        self.canvas.record_region(start_x_char, start_y_char, width, height)
+
         if button == 1:
             self.draw_filled_rectangle(start_x_char, start_y_char, width, height, True)
         elif button == 3:
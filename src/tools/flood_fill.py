@@ -21,17 +21,27 @@ from gi.repository import Adw
 from gi.repository import Gtk
 from gi.repository import Gdk, Gio, GObject
 
-class Fill(GObject.GObject):
-    def __init__(self, _canvas, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.canvas = _canvas
+from .tool import Tool
+from ..flood import match_spans, pattern_texts, gradient_texts
+from ..imaging import ASCII_RAMP
 
-        self._active = False
+class Fill(Tool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
 
         self.canvas.click_gesture.connect("pressed", self.on_click_pressed)
         self.canvas.click_gesture.connect("released", self.on_click_released)
         self.canvas.click_gesture.connect("stopped", self.on_click_stopped)
 
+        self.canvas.motion_controller.connect("motion", self.on_motion)
+        self.canvas.motion_controller.connect("leave", self.on_leave)
+
+        builder = Gtk.Builder.new_from_resource("/io/github/nokse22/asciidraw/ui/fill_sidebar.ui")
+        self._sidebar = builder.get_object("fill_stack_page")
+        self.fill_mode_combo = builder.get_object("fill_mode_combo")
+        self.fill_selection_switch = builder.get_object("fill_selection_switch")
+        self.fill_source_combo = builder.get_object("fill_source_combo")
+
         self.start_x = 0
         self.start_y = 0
 
@@ -42,29 +52,126 @@ class Fill(GObject.GObject):
         self.end_y = 0
 
         self._size = 1
+        self._mode = 0
+        self._in_selection = False
+        self._source = 0
+
+        # Areas up to this many cells are previewed under the pointer
+        self.preview_limit = 10000
+        self.hovered = None
+
+        self.fill_mode_combo.bind_property("selected", self, "mode")
+        self.fill_selection_switch.bind_property("active", self, "in_selection")
+        self.fill_source_combo.bind_property("selected", self, "source")
+        self.fill_mode_combo.bind_property(
+            "selected", self.fill_selection_switch, "sensitive",
+            GObject.BindingFlags.SYNC_CREATE, lambda binding, value: value == 1)
+
+    @GObject.Property(type=int, default=0)
+    def mode(self):
+        return self._mode
+
+    @mode.setter
+    def mode(self, value):
+        self._mode = value
+        self.notify('mode')
 
     @GObject.Property(type=bool, default=False)
-    def active(self):
-        return self._active
+    def in_selection(self):
+        return self._in_selection
+
+    @in_selection.setter
+    def in_selection(self, value):
+        self._in_selection = value
+        self.notify('in_selection')
+
+    @GObject.Property(type=int, default=0)
+    def source(self):
+        return self._source
+
+    @source.setter
+    def source(self, value):
+        self._source = value
+        self.notify('source')
+
+    def get_texts_func(self):
+        """Returns the function giving the text of the filled spans, None
+        when they are filled with the selected character"""
+        if self._source == 1:
+            if self.canvas.selection_rect is None:
+                return None
+            pattern = self.canvas.get_region(*self.canvas.selection_rect)
+            return lambda spans: pattern_texts(spans, pattern)
+        if self._source == 2:
+            return lambda spans: gradient_texts(spans, ASCII_RAMP)
+        if self._source == 3:
+            return lambda spans: gradient_texts(spans, ASCII_RAMP, True)
+        return None
+
+    def on_active_changed(self, value):
+        self.clear_hover()
+
+    def on_motion(self, controller, x, y):
+        if not self._active: return
+        if self._mode != 0:
+            self.clear_hover()
+            return
+
+        component = self.canvas.component_at(int(x / self.x_mul), int(y / self.y_mul))
+        if component is self.hovered:
+            return
+        self.clear_hover()
+        if component is None or component.size > self.preview_limit:
+            return
+
+        char = self.canvas.get_selected_char()
+        texts_func = self.get_texts_func()
+        if texts_func is None and char == component.char:
+            return
+        self.hovered = component
+        if texts_func is None:
+            texts = [char * (end - start) for y, start, end in component.spans]
+        else:
+            texts = texts_func(component.spans)
+        self.canvas.write_spans(component.spans, texts, False)
+        self.canvas.update_preview()
+
+    def on_leave(self, controller):
+        if not self._active: return
+        self.clear_hover()
 
-    @active.setter
-    def active(self, value):
-        self._active = value
-        self.notify('active')
+    def clear_hover(self):
+        if self.hovered is None:
+            return
+        self.hovered = None
+        self.canvas.clear_preview()
 
     def on_click_pressed(self, click, arg, x, y):
         if not self._active: return
+        self.clear_hover()
         x_char = int(x / self.x_mul)
         y_char = int(y / self.y_mul)
 
-        self.canvas.add_undo_action(_("Fill"))
-
         button = click.get_current_button()
 
         if button == 1:
-            flood_fill(self.canvas, x_char, y_char, self.canvas.get_selected_char())
+            char = self.canvas.get_selected_char()
         elif button == 3:
-            flood_fill(self.canvas, x_char, y_char, self.canvas.get_unselected_char())
+            char = self.canvas.get_unselected_char()
+        else:
+            return
+
+        texts_func = self.get_texts_func()
+        if self._mode == 0:
+            self.canvas.add_undo_action(_("Fill"))
+            flood_fill(self.canvas, x_char, y_char, char, texts_func)
+        else:
+            rect = self.canvas.selection_rect if self._in_selection else None
+            # Without a selection there is nothing to replace in
+            if self._in_selection and rect is None:
+                return
+            self.canvas.add_undo_action(_("Replace All"))
+            replace_all(self.canvas, x_char, y_char, char, rect, texts_func)
 
         self.canvas.update()
 
@@ -76,27 +183,34 @@ class Fill(GObject.GObject):
         if not self._active: return
         pass
 
-def flood_fill(canvas, start_x, start_y, replacement_char):
+def flood_fill(canvas, start_x, start_y, replacement_char, texts_func=None):
     target_char = canvas.get_char_at(start_x, start_y)
 
-    if target_char == replacement_char:
+    if target_char is None or (texts_func is None and target_char == replacement_char):
         return
 
-    rows, cols = canvas.get_canvas_size()
+    paint_spans(canvas, canvas.component_at(start_x, start_y).spans, replacement_char, texts_func)
 
-    stack = [(start_x, start_y)]
+def replace_all(canvas, start_x, start_y, replacement_char, rect=None, texts_func=None):
+    """Replaces every occurrence of the character at start_x, start_y,
+    inside rect if given, as one undoable region"""
+    target_char = canvas.get_char_at(start_x, start_y)
 
-    while stack:
-        x, y = stack.pop()
+    if target_char is None or (texts_func is None and target_char == replacement_char):
+        return
 
-        if canvas.get_char_at(x, y) == target_char:
-            canvas.set_char_at(x, y, replacement_char, True)
+    if rect is None:
+        spans = match_spans(canvas.drawing, target_char)
+    else:
+        spans = match_spans(canvas.drawing, target_char, *rect)
+    paint_spans(canvas, spans, replacement_char, texts_func)
 
-            if x > 0:
-                stack.append((x - 1, y))
-            if x < rows - 1:
-                stack.append((x + 1, y))
-            if y > 0:
-                stack.append((x, y - 1))
-            if y < cols - 1:
-                stack.append((x, y + 1))
+def paint_spans(canvas, spans, replacement_char, texts_func=None):
+    """Fills the spans with the character or, given texts_func, with the
+    text it returns for them, in one bulk write"""
+    if not spans:
+        return
+    if texts_func is None:
+        canvas.fill_spans(spans, replacement_char)
+    else:
+        canvas.write_spans(spans, texts_func(spans), True)
@@ -29,6 +29,7 @@ class Freehand(Tool):
 
         self.canvas.drag_gesture.connect("drag-begin", self.on_drag_begin)
         self.canvas.drag_gesture.connect("drag-update", self.on_drag_follow)
+        self.canvas.drag_gesture.connect("drag-end", self.on_drag_end)
 
         builder = Gtk.Builder.new_from_resource("/io/github/nokse22/asciidraw/ui/freehand_sidebar.ui")
         self._sidebar = builder.get_object("freehand_stack_page")
@@ -62,7 +63,7 @@ class Freehand(Tool):
         self.start_x = start_x
         self.start_y = start_y
 
-        self.canvas.add_undo_action(_("Freehand"))
+        self.canvas.begin_stroke(_("Freehand"))
 
     def on_drag_follow(self, gesture, end_x, end_y):
         if not self._active: return
@@ -84,3 +85,7 @@ class Freehand(Tool):
             if button == 1: self.canvas.draw_at(x_coord + delta[0], y_coord + delta[1])
             elif button == 3: self.canvas.draw_inverted_at(x_coord + delta[0], y_coord + delta[1])
         self.canvas.update()
+
+    def on_drag_end(self, gesture, delta_x, delta_y):
+        if not self._active: return
+        self.canvas.end_stroke()
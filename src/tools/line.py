@@ -96,7 +96,7 @@ class Line(Tool):
         self.start_x = start_x
         self.start_y = start_y
         if self._line_type == 2:
-            self.canvas.add_undo_action(_("Freehand Line"))
+            self.canvas.begin_stroke(_("Freehand Line"))
             start_x_char = start_x // self.x_mul
             start_y_char = start_y // self.y_mul
             self.prev_prev_pos = [start_x_char, start_y_char]
@@ -153,6 +153,7 @@ class Line(Tool):
             self.canvas.add_undo_action(_("Step Line"))
             self.draw_step_line(start_x_char, start_y_char, width, height, True)
         elif self._line_type == 2:
+            self.canvas.end_stroke()
             self.prev_char = ""
             self.prev_prev_pos = [0,0]
             self.prev_pos = [0,0]
@@ -93,6 +93,11 @@ class Select(Tool):
 
         self.selection.set_visible(False)
 
+        # The last selection stays available to the other tools until a
+        # new one is started
+        if value:
+            self.canvas.selection_rect = None
+
         self.selection_start_x_char = -1
         self.selection_start_y_char = -1
 
@@ -123,13 +128,8 @@ class Select(Tool):
 
             self.canvas.add_undo_action(_("Move"))
 
-            for y in range(1, int(height)):
-                line = []
-                for x in range(1, int(width)):
-                    line.append(
-                        self.canvas.get_char_at(
-                            start_x_char + x, start_y_char + y) or " ")
-                self.moved_text.append(line)
+            self.moved_text = self.canvas.get_region(
+                start_x_char + 1, start_y_char + 1, width - 1, height - 1)
 
             self.delete_selection()
 
@@ -221,6 +221,7 @@ class Select(Tool):
             self.canvas.update()
 
         self.has_selection = True
+        self.store_selection()
 
     def on_click_pressed(self, click, arg, x, y):
         if not self._active:
@@ -234,6 +235,30 @@ class Select(Tool):
 
         self.click_released = True
 
+        if arg >= 2:
+            self.select_component(int(x // self.x_mul), int(y // self.y_mul))
+
+    def select_component(self, x_char, y_char):
+        """Selects the bounds of the area of equal characters under
+        x_char, y_char"""
+        component = self.canvas.component_at(x_char, y_char)
+        if component is None:
+            return
+
+        x, y, width, height = component.bounds
+        self.selection_start_x_char = x
+        self.selection_start_y_char = y
+        self.selection_delta_char_x = width - 1
+        self.selection_delta_char_y = height - 1
+
+        self.update_selection()
+        self.selection.set_visible(True)
+        self.has_selection = True
+        self.store_selection()
+
+        # The selection is kept when the click sequence stops
+        self.click_released = False
+
     def on_click_stopped(self, click):
         if not self._active:
             return
@@ -258,8 +283,22 @@ class Select(Tool):
 
         self.click_released = False
 
+        self.canvas.selection_rect = None
+
         self.selection.set_visible(False)
 
+    def store_selection(self):
+        start_x_char, start_y_char, width, height = self.translate(
+                self.selection_start_x_char,
+                self.selection_start_y_char,
+                self.selection_delta_char_x,
+                self.selection_delta_char_y
+        )
+        if width <= 1 or height <= 1:
+            self.canvas.selection_rect = None
+            return
+        self.canvas.selection_rect = (start_x_char + 1, start_y_char + 1, width - 1, height - 1)
+
     def update_selection(self):
         if self.selection.get_parent() is None:
             self.canvas.fixed.put(self.selection, 0, 0)
@@ -295,15 +334,8 @@ class Select(Tool):
                 self.selection_delta_char_y
         )
 
-        for y in range(1, int(height)):
-            line = []
-            for x in range(1, int(width)):
-                line.append(
-                    self.canvas.get_char_at(
-                        start_x_char + x,
-                        start_y_char + y
-                    ) or " ")
-            self.moved_text.append(line)
+        self.moved_text = self.canvas.get_region(
+            start_x_char + 1, start_y_char + 1, width - 1, height - 1)
 
         self.delete_selection()
 
@@ -312,7 +344,7 @@ class Select(Tool):
         elif angle == -90:
             self.moved_text = list(reversed(list(zip(*self.moved_text))))
 
-        self.moved_text = [list(row) for row in self.moved_text]
+        self.moved_text = [''.join(row) for row in self.moved_text]
 
         center_x = start_x_char + (width - 2) // 2
         center_y = start_y_char + (height - 2) // 2
@@ -339,6 +371,7 @@ class Select(Tool):
         )
 
         self.update_selection()
+        self.store_selection()
 
         self.canvas.update()
 
@@ -352,14 +385,7 @@ class Select(Tool):
                 self.selection_delta_char_y
         )
 
-        for y in range(1, int(height)):
-            for x in range(1, int(width)):
-                self.canvas.set_char_at(
-                    start_x_char + x,
-                    start_y_char + y,
-                    ' ',
-                    True
-                )
+        self.canvas.fill_region(start_x_char + 1, start_y_char + 1, width - 1, height - 1, ' ')
 
         self.canvas.update()
 
@@ -377,13 +403,7 @@ class Select(Tool):
         return start_x, start_y, width, height
 
     def get_moved_string(self):
-        text = ""
-        for line in self.moved_text:
-            for char in line:
-                text += char
-            text += '\n'
-
-        return text
+        return ''.join(line + '\n' for line in self.moved_text)
 
     def copy_selection(self, *args):
         start_x_char, start_y_char, width, height = self.translate(
@@ -393,16 +413,9 @@ class Select(Tool):
                 self.selection_delta_char_y
         )
 
-        selected_text = ""
-
-        for y in range(1, int(height)):
-            line = ""
-            for x in range(1, int(width)):
-                line += self.canvas.get_char_at(
-                        start_x_char + x,
-                        start_y_char + y
-                    ) or " "
-            selected_text += line + "\n"
+        selected_text = ''.join(
+            line + "\n" for line in self.canvas.get_region(
+                start_x_char + 1, start_y_char + 1, width - 1, height - 1))
 
         clipboard = Gdk.Display().get_default().get_clipboard()
         clipboard.set(selected_text)
@@ -19,15 +19,18 @@
 
 from gi.repository import Adw
 from gi.repository import Gtk
-from gi.repository import Gdk, Gio, GObject, GdkPixbuf
+from gi.repository import Gdk, Gio, GObject, GdkPixbuf, GLib
 
 from .palette import Palette
 from .new_palette_window import NewPaletteDialog
 
 from .tools import *
 from .canvas import Canvas
+from .importer import ImageImporter
+from . import imaging
 
 import unicodedata
+import operator
 import os
 import webbrowser
 
@@ -74,6 +77,7 @@ class AsciiDrawWindow(Adw.ApplicationWindow):
     # Canvas side popover
     width_spin = Gtk.Template.Child()
     height_spin = Gtk.Template.Child()
+    import_columns_spin = Gtk.Template.Child()
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -113,11 +117,34 @@ class AsciiDrawWindow(Adw.ApplicationWindow):
         self.canvas.bind_property('primary_selected', self.primary_char_button, 'active', GObject.BindingFlags.BIDIRECTIONAL)
         self.canvas.bind_property('primary_char', self.primary_char_button, 'label', GObject.BindingFlags.BIDIRECTIONAL)
         self.canvas.bind_property('secondary_char', self.secondary_char_button, 'label', GObject.BindingFlags.BIDIRECTIONAL)
-        self.canvas.connect("undo-added", self.on_undo_added)
-        self.canvas.connect("undo-removed", self.on_undo_removed)
-        self.canvas.connect("redo-removed", self.on_redo_removed)
+        for signal in ("undo-added", "undo-removed", "redo-removed", "undo-evicted", "history-changed"):
+            self.canvas.connect(signal, self.on_history_changed)
+        self.canvas.connect("node-undone", self.on_node_undone)
+        self.canvas.connect("node-redone", self.on_node_redone)
+        self.settings.bind("history-max-steps", self.canvas, "history_max_steps", Gio.SettingsBindFlags.DEFAULT)
+        self.settings.bind("history-max-bytes", self.canvas, "history_max_bytes", Gio.SettingsBindFlags.DEFAULT)
         self.toast_overlay.set_child(self.canvas)
 
+        # Images are converted on a thread, the toast shows the progress
+        # of the one being converted
+        self.importer = ImageImporter()
+        self.importer.connect("started", self.on_import_started)
+        self.importer.connect("progress", self.on_import_progress)
+        self.importer.connect("finished", self.on_import_finished)
+        self.importer.connect("failed", self.on_import_failed)
+        self.importer.connect("cancelled", self.on_import_cancelled)
+        self.import_toast = None
+        # Toasts offering the journals left by a crash, by the path the
+        # journal was kept aside at
+        self.recover_toasts = {}
+        # The undo action and the job of the last import, while the
+        # action is the current one and nothing was undone after it the
+        # image can be sampled again at another width in place
+        self.import_node = None
+        self.import_job = None
+        self.import_columns_spin.set_value(self.settings.get_int("import-columns"))
+        self.import_columns_spin.connect("notify::value", self.on_import_columns_changed)
+
         self.freehand_tool = Freehand(self.canvas)
         self.freehand_tool.bind_property('active', self.free_button, 'active', GObject.BindingFlags.BIDIRECTIONAL)
         self.freehand_tool.add_sidebar_to(self.sidebar_stack)
@@ -157,6 +184,7 @@ class AsciiDrawWindow(Adw.ApplicationWindow):
 
         self.fill_tool = Fill(self.canvas)
         self.fill_tool.bind_property('active', self.fill_button, 'active', GObject.BindingFlags.BIDIRECTIONAL)
+        self.fill_tool.add_sidebar_to(self.sidebar_stack)
 
         prev_btn = None
 
@@ -246,11 +274,66 @@ class AsciiDrawWindow(Adw.ApplicationWindow):
 
         self.update_canvas_size_spins()
 
+        self.start_journal()
+
+    def get_journal_path(self):
+        """The journal of a saved file is hidden next to it, the one of
+        a new canvas is in the cache directory"""
+        if self.file_path != "":
+            directory, file_name = os.path.split(self.file_path)
+            return os.path.join(directory, f".{file_name}.journal")
+        return os.path.join(GLib.get_user_cache_dir(), 'ascii-draw', 'untitled.journal')
+
+    def start_journal(self, recover=True):
+        """Journals the canvas from now on, a journal left behind by a
+        crash is kept aside and offered for recovery, and so is one kept
+        aside before that was neither recovered nor dismissed"""
+        path = self.get_journal_path()
+        recover_path = path + '.recover'
+        if os.path.exists(path) and path != getattr(self.canvas.journal, 'path', None):
+            if recover:
+                os.replace(path, recover_path)
+            else:
+                os.remove(path)
+        if recover and os.path.exists(recover_path) and recover_path not in self.recover_toasts:
+            # The toast stays with the file the journal belongs to,
+            # recovering brings both back whatever is open by then
+            toast = Adw.Toast(
+                title=_("Unsaved changes from a previous session were found"),
+                button_label=_("Recover"),
+                timeout=0)
+            toast.connect("button-clicked", self.on_recover_clicked, recover_path, self.file_path)
+            toast.connect("dismissed", self.on_recover_dismissed, recover_path)
+            self.recover_toasts[recover_path] = toast
+            self.toast_overlay.add_toast(toast)
+        try:
+            self.canvas.start_journal(path)
+        except OSError:
+            print(f"Error creating {path}.")
+
+    def on_recover_clicked(self, toast, recover_path, file_path):
+        try:
+            if not self.canvas.recover_journal(recover_path):
+                toast = Adw.Toast(title=_("Nothing could be recovered"), timeout=2)
+                self.toast_overlay.add_toast(toast)
+            else:
+                self.canvas.history.current.file_paths = (self.file_path, file_path)
+                self.set_file_path(file_path)
+        except (OSError, ValueError):
+            print(f"Error reading {recover_path}.")
+        self.update_canvas_size_spins()
+
+    def on_recover_dismissed(self, toast, recover_path):
+        self.recover_toasts.pop(recover_path, None)
+        if os.path.exists(recover_path):
+            os.remove(recover_path)
+
     def open_palettes_dir(self):
         webbrowser.open(f"{self.data_dir}/palettes/")
 
     def change_theme(self, manager=Adw.StyleManager(), *args):
         self.canvas.color = 1 if manager.get_dark() else 0
+        self.canvas.repaint_all()
         self.canvas.update()
 
     def show_new_palette_window(self, chars=''):
@@ -359,10 +442,17 @@ class AsciiDrawWindow(Adw.ApplicationWindow):
             try:
                 with open(path, 'r') as file:
                     input_string = file.read()
-                self.canvas.set_content(input_string)
+                self.canvas.add_undo_action(_("Open"))
+                self.canvas.history.current.file_paths = (self.file_path, path)
+                if not self.canvas.set_content(input_string, True):
+                    toast = Adw.Toast(title=_("Opened file exceeds the maximum canvas size"))
+                    self.toast_overlay.add_toast(toast)
                 self.file_path = path
                 file_name = os.path.basename(self.file_path)
                 self.title_widget.set_subtitle(file_name)
+                self.canvas.is_saved = True
+                self.start_journal()
+                self.update_canvas_size_spins()
             except IOError:
                 print(f"Error reading {path}.")
 
@@ -381,12 +471,7 @@ class AsciiDrawWindow(Adw.ApplicationWindow):
         Returns:
         str: A single ASCII character that corresponds to the given brightness level.
         """
-        # Wide range of ASCII characters from dark to light
-        ascii_chars = r"$@B%8&WM#*oahkbdpqwmZO0QLCJUYXzcvunxrjft/\|()1{}[]?-_+~<>i!lI;:,\"^`'."
-
-        # Map brightness to the appropriate ASCII character
-        index = int(brightness * (len(ascii_chars) - 1))  # Scale brightness to index range
-        return ascii_chars[index]
+        return imaging.brightness_to_ascii(brightness)
 
     def downsample_pixbuf(self, pixels, width, height, channels, rowstride, block_size):
         """
@@ -406,51 +491,7 @@ class AsciiDrawWindow(Adw.ApplicationWindow):
                 - new_width (int): The width of the downsampled image.
                 - new_height (int): The height of the downsampled image.
         """
-        # Calculate the dimensions of the downsampled image
-        new_width = width // block_size
-        new_height = height // block_size
-        downsampled_rgb = []
-        downsampled_brightness = []
-
-        for y in range(0, height, block_size):
-            row_rgb = []
-            row_brightness = []
-
-            for x in range(0, width, block_size):
-                # Accumulate RGB values within each block
-                total_r, total_g, total_b = 0, 0, 0
-                pixel_count = 0
-
-                for by in range(block_size):
-                    for bx in range(block_size):
-                        px = x + bx
-                        py = y + by
-                        if px < width and py < height:
-                            # Calculate the position of the pixel in the array
-                            pixel_index = py * rowstride + px * channels
-                            r = pixels[pixel_index]
-                            g = pixels[pixel_index + 1]
-                            b = pixels[pixel_index + 2]
-                            total_r += r
-                            total_g += g
-                            total_b += b
-                            pixel_count += 1
-
-                # Compute the average color for the block
-                avg_r = total_r // pixel_count
-                avg_g = total_g // pixel_count
-                avg_b = total_b // pixel_count
-
-                # Convert RGB to brightness (use the max component for simplicity)
-                brightness = max(avg_r, avg_g, avg_b) / 255.0
-                row_rgb.append((avg_r, avg_g, avg_b))
-                row_brightness.append(brightness)
-
-            # Append the row to maintain the correct top-to-bottom layout
-            downsampled_rgb.extend(row_rgb)
-            downsampled_brightness.extend(row_brightness)
-
-        return downsampled_rgb, downsampled_brightness, new_width, new_height
+        return imaging.downsample_pixbuf(pixels, width, height, channels, rowstride, block_size)
 
     def downsample_to_ascii(self, pixels, width, height, channels, rowstride, block_size):
         """
@@ -467,19 +508,10 @@ class AsciiDrawWindow(Adw.ApplicationWindow):
         Returns:
             str: The ASCII art representation of the image.
         """
-        # Step 1: Downsample and get brightness values
-        _, brightness_values, new_width, _ = self.downsample_pixbuf(
-            pixels, width, height, channels, rowstride, block_size
-        )
-
-        # Step 2: Map brightness to ASCII characters
-        ascii_art = ""
-        for i, brightness in enumerate(brightness_values):
-            if i > 0 and i % new_width == 0:
-                ascii_art += "\n"  # Newline at the end of each row
-            ascii_art += self.brightness_to_ascii(brightness)
-
-        return ascii_art
+        # Downsample to brightness levels and map them to ASCII characters
+        # through the lookup table of the ramp
+        ramp = imaging.RAMPS.get(self.settings.get_string("import-ramp"), imaging.ASCII_RAMP)
+        return imaging.pixels_to_ascii(pixels, width, height, channels, rowstride, block_size, ramp)
 
     def pixbuf_downsampled_to_rgb_hsb(self, pixels, width, height, channels, rowstride, block_size):
         """
@@ -500,15 +532,10 @@ class AsciiDrawWindow(Adw.ApplicationWindow):
         downsampled_rgb, _, new_width, new_height = self.downsample_pixbuf(
             pixels, width, height, channels, rowstride, block_size
         )
-        rgb_values = []
-        hsb_values = []
-
-        for r, g, b in downsampled_rgb:
-            rgb_values.append((r, g, b))
-            h, s, v = self.rgb_to_hsb(r, g, b)
-            hsb_values.append((h, s, v))
+        planes = [bytes(map(operator.itemgetter(channel), downsampled_rgb)) for channel in range(3)]
+        hsb_values = list(zip(*imaging.hsb_planes(*planes)))
 
-        return rgb_values, hsb_values, new_width, new_height
+        return downsampled_rgb, hsb_values, new_width, new_height
 
     def pixbuf_to_rgb_hsb(self, pixels, width, height, channels, rowstride):
         """
@@ -525,23 +552,11 @@ class AsciiDrawWindow(Adw.ApplicationWindow):
         Returns:
             tuple: A tuple containing the RGB values and HSB values.
         """
-        rgb_values = []
-        hsb_values = []
-
-        for y in range(height):
-            for x in range(width):
-                # Calculate pixel's position in the byte array
-                pixel_index = y * rowstride + x * channels
-                r = pixels[pixel_index]
-                g = pixels[pixel_index + 1]
-                b = pixels[pixel_index + 2]
-
-                # Store RGB values
-                rgb_values.append((r, g, b))
-
-                # Convert RGB to HSB
-                h, s, v = self.rgb_to_hsb(r, g, b)
-                hsb_values.append((h, s, v))
+        # The planes of the pixels are converted at once, the tuples are
+        # only built for the callers expecting them
+        planes = imaging.pixbuf_planes(pixels, width, height, channels, rowstride)
+        rgb_values = list(zip(*planes))
+        hsb_values = list(zip(*imaging.hsb_planes(*planes)))
 
         return rgb_values, hsb_values
 
@@ -558,36 +573,7 @@ class AsciiDrawWindow(Adw.ApplicationWindow):
             - s (float): Saturation (0-1)
             - v (float): Brightness (0-1)
         """
-        # Normalize RGB values to the range [0, 1]
-        rd = r / 255.0
-        gd = g / 255.0
-        bd = b / 255.0
-
-        # Find the maximum and minimum RGB values
-        max_val = max(rd, gd, bd)
-        min_val = min(rd, gd, bd)
-        delta = max_val - min_val
-
-        # Calculate Hue
-        if delta == 0:
-            h = 0
-        elif max_val == rd:
-            h = 60 * (((gd - bd) / delta) % 6)
-        elif max_val == gd:
-            h = 60 * (((bd - rd) / delta) + 2)
-        else:
-            h = 60 * (((rd - gd) / delta) + 4)
-
-        if h < 0:
-            h += 360
-
-        # Calculate Saturation
-        s = 0 if max_val == 0 else (delta / max_val)
-
-        # Brightness is just the max value
-        v = max_val
-
-        return h, s, v
+        return imaging.rgb_to_hsb(r, g, b)
 
     def import_image(self):
         """
@@ -641,70 +627,168 @@ class AsciiDrawWindow(Adw.ApplicationWindow):
         """
         Handles the response from the import image dialog.
         This method is triggered when the user selects an image file to import. It performs the following steps:
-        1. Opens the selected file.
-        2. Loads the image from the file using GdkPixbuf.
-        3. Downsamples the image to obtain RGB and brightness values.
-        4. Converts the brightness values to ASCII characters and writes them to an output file.
-        5. Loads and displays the ASCII art on the canvas.
+        1. Gets the path of the selected file.
+        2. Queues the image on the importer, which loads it using GdkPixbuf,
+           downsamples it and converts the brightness values to ASCII
+           characters on its own thread.
+        3. The ASCII art is then loaded on the canvas by on_import_finished
+           and written to the export file, when one is set.
         
         Note: 
             We were able to reuse some existing functionality to create this function.
         Args:
             dialog: The file dialog instance.
             response: The response from the dialog indicating the user's action.
-        Raises:
-            IOError: If there is an error reading the selected file or the output file.
         """
         file = dialog.open_finish(response)
         print(f"Selected File: {file.get_path()}")
 
         if file:
             path = file.get_path()
-            try:
-                # Load an image from a file
-                pixbuf = GdkPixbuf.Pixbuf.new_from_file(path)
-
-                pixels = pixbuf.get_pixels()
-                width = pixbuf.get_width()
-                height = pixbuf.get_height()
-                channels = pixbuf.get_n_channels()
-                rowstride = pixbuf.get_rowstride()
-
-                # Set a block size for downsampling (e.g., 4 for a lower-resolution ASCII output)
-                block_size = 1
-
-                # Perform downsampling to get RGB and brightness values
-                _, downsampled_brightness, new_width, new_height = self.downsample_pixbuf(
-                    pixels, width, height, channels, rowstride, block_size
-                )
-
-                output_path = os.path.expanduser("~/Desktop/ascii-draw/output.txt")
-                # Open the specified path for writing
-                with open(output_path, 'w') as file_out:
-                    for y in range(new_height):
-                        for x in range(new_width):
-                            # Calculate the index for the downsampled brightness values
-                            index = y * new_width + x
-                            brightness = downsampled_brightness[index]  # Accessing brightness value
-                            ascii_char = self.brightness_to_ascii(brightness)  # Get ASCII character based on brightness
-                            file_out.write(ascii_char)  # Write the ASCII character
-                        file_out.write("\n")  # New line after each row
-
-                print(f"ASCII art written to {output_path}")
-
-                # Load and display the ASCII art on the canvas
-                try:
-                    with open(output_path, 'r') as file:
-                        input_string = file.read()
-                    self.canvas.set_content(input_string)
-                    self.file_path = path
-                    file_name = os.path.basename(self.file_path)
-                    self.title_widget.set_subtitle(file_name)
-                except IOError:
-                    print(f"Error reading {path}.")
 
-            except IOError:
-                print(f"Error reading {path}.")
+            # Decoding, downsampling and the conversion to ASCII characters
+            # run on the importer thread, the result is loaded on the canvas
+            # by on_import_finished
+            self.importer.import_file(
+                path, self.settings.get_int("import-columns"), self.get_cell_aspect(), self.get_import_ramp())
+
+    def get_cell_aspect(self):
+        """
+        Get the height of a canvas cell over its width, imported images
+        are sampled in blocks of the same shape so they are not stretched.
+
+        Returns:
+            float: The aspect ratio of a cell.
+        """
+        return self.canvas.y_mul / self.canvas.x_mul
+
+    def get_import_ramp(self):
+        """
+        Get the characters used for the brightness of imported images.
+
+        Returns:
+            str: The ramp chosen in the import-ramp setting, from dark to light.
+        """
+        return imaging.RAMPS.get(self.settings.get_string("import-ramp"), imaging.ASCII_RAMP)
+
+    def on_import_columns_changed(self, spin, pspec):
+        """
+        Store the width of imported images and, while the last import is
+        the current undo action with nothing to redo after it, sample it
+        again at the new width from the summed-area table of its job.
+
+        Args:
+            spin: The spin row with the number of characters per row.
+            pspec: The changed property.
+        """
+        columns = int(spin.get_value())
+        self.settings.set_int("import-columns", columns)
+
+        if self.import_node is None or self.canvas.history.current is not self.import_node:
+            return
+        # Changes undone back to the import would lose their redo
+        if self.import_node.children:
+            return
+        ascii_art = self.import_job.resample(columns, self.get_cell_aspect(), self.get_import_ramp())
+        if ascii_art is None:
+            return
+        # The undo action already keeps the drawing from before the import
+        self.canvas.set_content(ascii_art + "\n", True)
+        self.update_canvas_size_spins()
+
+    def on_import_started(self, importer, path):
+        """
+        Show a toast with the progress of the image being imported and a
+        button to cancel it.
+
+        Args:
+            importer: The ImageImporter converting the image.
+            path (str): The path of the image.
+        """
+        self.dismiss_import_toast()
+        self.import_toast = Adw.Toast(
+            title=_("Importing {}").format(os.path.basename(path)),
+            button_label=_("Cancel"),
+            timeout=0)
+        self.import_toast.connect("button-clicked", lambda *args: self.importer.cancel())
+        self.toast_overlay.add_toast(self.import_toast)
+
+    def on_import_progress(self, importer, path, fraction):
+        """
+        Update the import toast with the fraction of the image converted.
+
+        Args:
+            importer: The ImageImporter converting the image.
+            path (str): The path of the image.
+            fraction (float): The fraction converted, between 0 and 1.
+        """
+        if self.import_toast is not None:
+            self.import_toast.set_title(
+                _("Importing {} ({}%)").format(os.path.basename(path), int(fraction * 100)))
+
+    def on_import_finished(self, importer, path, ascii_art, job):
+        """
+        Load the ASCII art of an imported image on the canvas as one
+        undoable action. Images imported back to back are loaded in the
+        order they were chosen.
+
+        Args:
+            importer: The ImageImporter that converted the image.
+            path (str): The path of the image.
+            ascii_art (str): The ASCII art of the image.
+            job: The ImportJob of the image, it keeps its summed-area table.
+        """
+        self.dismiss_import_toast()
+
+        # Load and display the ASCII art on the canvas, the canvas
+        # stays untitled so saving never overwrites the image
+        self.canvas.add_undo_action(_("Import Image"))
+        self.import_node = self.canvas.history.current
+        self.import_node.file_paths = (self.file_path, "")
+        self.import_job = job
+        if not self.canvas.set_content(ascii_art + "\n", True):
+            toast = Adw.Toast(title=_("Imported image exceeds the maximum canvas size"))
+            self.toast_overlay.add_toast(toast)
+        self.file_path = ""
+        self.title_widget.set_subtitle("")
+        self.start_journal()
+        self.update_canvas_size_spins()
+
+        self.export_imported_text(ascii_art)
+
+    def on_import_failed(self, importer, path, message):
+        self.dismiss_import_toast()
+        print(f"Error reading {path}: {message}")
+        toast = Adw.Toast(title=_("{} could not be imported").format(os.path.basename(path)), timeout=2)
+        self.toast_overlay.add_toast(toast)
+
+    def on_import_cancelled(self, importer, path):
+        self.dismiss_import_toast()
+
+    def dismiss_import_toast(self):
+        if self.import_toast is not None:
+            self.import_toast.dismiss()
+            self.import_toast = None
+
+    def export_imported_text(self, ascii_art):
+        """
+        Write the ASCII art of an imported image to the file set in the
+        import-export-path setting, nothing is written when it is empty.
+
+        Args:
+            ascii_art (str): The ASCII art of the imported image.
+        """
+        output_path = self.settings.get_string("import-export-path")
+        if output_path == "":
+            return
+        output_path = os.path.expanduser(output_path)
+        try:
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            with open(output_path, 'w') as file_out:
+                file_out.write(ascii_art + "\n")
+            print(f"ASCII art written to {output_path}")
+        except OSError:
+            print(f"Error writing to {output_path}.")
 # ========================
 # Our Functions End Here
 # ========================
@@ -749,13 +833,9 @@ class AsciiDrawWindow(Adw.ApplicationWindow):
         self.canvas.change_canvas_size(40, 20)
         self.file_path = ""
         self.title_widget.set_subtitle("")
-        self.canvas.undo_changes = []
-        self.canvas.redo_changes = []
-        self.undo_button.set_sensitive(False)
-        self.undo_button.set_tooltip_text("")
-        self.redo_button.set_sensitive(False)
-        self.redo_button.set_tooltip_text("")
+        self.canvas.reset_history()
         self.canvas.is_saved = True
+        self.start_journal(False)
         toast = Adw.Toast(title=_("New Canvas"), timeout=2)
         self.toast_overlay.add_toast(toast)
 
@@ -795,6 +875,7 @@ class AsciiDrawWindow(Adw.ApplicationWindow):
             toast = Adw.Toast(title=_("Saved successfully"), timeout=2)
             self.toast_overlay.add_toast(toast)
             self.canvas.is_saved = True
+            self.start_journal(False)
         except IOError:
             print(f"Error writing to {file_path}.")
 
@@ -817,7 +898,11 @@ class AsciiDrawWindow(Adw.ApplicationWindow):
         x = int(self.width_spin.get_value())
         y = int(self.height_spin.get_value())
 
-        self.canvas.change_canvas_size(x, y)
+        if (x, y) == self.canvas.get_canvas_size():
+            return
+        self.canvas.add_undo_action(_("Resize"))
+        self.canvas.change_canvas_size(x, y, True)
+        self.canvas.update()
 
     def on_style_changed(self, btn, box):
         child = box.get_first_child()
@@ -925,7 +1010,7 @@ class AsciiDrawWindow(Adw.ApplicationWindow):
         print("fill")
         current_sidebar = self.sidebar_stack.get_visible_child_name()
         if current_sidebar != "character_page" and current_sidebar != "style_page":
-            self.sidebar_stack.set_visible_child_name("character_page")
+            self.sidebar_stack.set_visible_child_name("fill_page")
         self.canvas.clear_preview()
 
     def on_delete_clicked(self):
@@ -945,34 +1030,49 @@ class AsciiDrawWindow(Adw.ApplicationWindow):
 
         self.show_new_palette_window(unique_string)
 
-    def on_undo_added(self, widget, undo_name):
-        self.undo_button.set_sensitive(True)
-        self.undo_button.set_tooltip_text(_("Undo") + " " + undo_name)
+    def on_node_undone(self, canvas, node):
+        if node.file_paths is not None:
+            self.set_file_path(node.file_paths[0])
+
+    def on_node_redone(self, canvas, node):
+        if node.file_paths is not None:
+            self.set_file_path(node.file_paths[1])
 
-    def on_undo_removed(self, widget):
-        if len(self.canvas.undo_changes) == 0:
+    def set_file_path(self, file_path):
+        """Makes file_path the file of the drawing when undo or redo go
+        past opening a file or a recovery, saving writes to it and the
+        journal moves next to it"""
+        if file_path == self.file_path:
+            return
+        self.file_path = file_path
+        self.title_widget.set_subtitle(os.path.basename(file_path))
+        self.start_journal()
+
+    def on_history_changed(self, widget, *args):
+        history = self.canvas.history
+        if history.can_undo():
+            self.undo_button.set_sensitive(True)
+            self.undo_button.set_tooltip_text(_("Undo") + " " + history.current.name)
+        else:
             self.undo_button.set_sensitive(False)
             self.undo_button.set_tooltip_text("")
-        else:
-            self.undo_button.set_tooltip_text(_("Undo ") + self.canvas.undo_changes[-1].name)
 
-        self.redo_button.set_sensitive(True)
-        self.redo_button.set_tooltip_text(_("Redo ") + self.canvas.redo_changes[-1].name)
-
-    def on_redo_removed(self, widget):
-        if len(self.canvas.redo_changes) == 0:
+        if history.can_redo():
+            self.redo_button.set_sensitive(True)
+            self.redo_button.set_tooltip_text(_("Redo") + " " + history.current.redo_child.name)
+        else:
             self.redo_button.set_sensitive(False)
             self.redo_button.set_tooltip_text("")
-        else:
-            self.redo_button.set_tooltip_text(_("Redo ") + self.canvas.redo_changes[-1].name)
 
     @Gtk.Template.Callback("undo_first_change")
     def undo_first_change(self, *args):
         self.canvas.undo()
+        self.update_canvas_size_spins()
 
     @Gtk.Template.Callback("redo_last_change")
     def redo_last_change(self, *args):
         self.canvas.redo()
+        self.update_canvas_size_spins()
 
     @Gtk.Template.Callback("close_sidebar")
     def close_sidebar(self, *args):